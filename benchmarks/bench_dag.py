@@ -0,0 +1,75 @@
+"""Compares StageGraph with networkx.DiGraph for building and sorting plans.
+
+Builds the graph for synthetic plans with sort_stage, then runs the
+priority-keyed topological sort, reporting time and peak traced memory for
+each backend. networkx is no longer a dependency, so its column is skipped
+unless it is installed. Run from the repository root with:
+
+    PYTHONPATH=. python benchmarks/bench_dag.py
+"""
+
+import time
+import tracemalloc
+
+from synthetic import nested_groups
+from simple_project_tool.dag_utilities import StageGraph
+from simple_project_tool.sort_utilities import sort_stage, node_priority_for_sorting
+
+try:
+    import networkx as nx
+except ImportError:
+    nx = None
+
+
+def build_and_sort(*, project, make_graph, sort):
+    G = make_graph()
+    by_title = {}
+    sort_stage(G=G, by_title=by_title, parent_stage=None, stage=project, parallel=False)
+    return sort(G, key=lambda n: node_priority_for_sorting(node=n, by_title=by_title))
+
+
+def measure(**kwargs):
+    tracemalloc.start()
+    start = time.perf_counter()
+    order = build_and_sort(**kwargs)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return order, elapsed, peak
+
+
+def main():
+    backends = [
+        (
+            "StageGraph",
+            StageGraph,
+            lambda G, key: G.lexicographical_topological_sort(key=key),
+        ),
+    ]
+    if nx is not None:
+        backends.append(
+            (
+                "networkx",
+                nx.DiGraph,
+                lambda G, key: list(nx.lexicographical_topological_sort(G, key=key)),
+            )
+        )
+    for stage_count in (1_000, 10_000, 100_000):
+        orders = []
+        for name, make_graph, sort in backends:
+            # Stages are annotated in place, so each backend gets a fresh plan.
+            project = nested_groups(stage_count=stage_count)
+            order, elapsed, peak = measure(
+                project=project, make_graph=make_graph, sort=sort
+            )
+            orders.append(order)
+            print(
+                f"{stage_count:>7} stages {name:>10}: {elapsed * 1000:9.1f} ms, "
+                f"peak {peak / 2**20:7.1f} MiB"
+            )
+        if len(orders) > 1 and orders[0] != orders[1]:
+            print("  orders differ between backends!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""Times generate_mermaid on synthetic plans of nested groups.
+
+Every group holds ten sequential leaves and sits inside a parallel group of
+ten, so roughly one stage in ten is a sub graph. Run from the repository root
+with:
+
+    PYTHONPATH=. python benchmarks/bench_mermaid.py
+"""
+
+import io
+import time
+
+from synthetic import nested_groups
+from simple_project_tool.mermaid_utilities import generate_mermaid
+
+
+def main():
+    for stage_count in (1_000, 10_000, 100_000):
+        project = nested_groups(stage_count=stage_count)
+        start = time.perf_counter()
+        generate_mermaid(project=project, complete_is_tree=False, out=io.StringIO())
+        elapsed = time.perf_counter() - start
+        print(f"{stage_count:>7} stages: {elapsed * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
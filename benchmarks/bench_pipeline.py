@@ -0,0 +1,133 @@
+"""Times each step of the pipeline on synthetic plans at several sizes.
+
+For each size a plan is generated (see synthetic.py), written to a
+temporary YAML file and put through every step `spt` runs: parsing with the
+safe and round-trip loaders, schema validation, sorting, Mermaid output,
+the order of work and the YAML update. Each step is timed on its own and the
+best of `--repeat` runs is reported, in milliseconds. Run from the
+repository root with:
+
+    PYTHONPATH=. python benchmarks/bench_pipeline.py
+    PYTHONPATH=. python benchmarks/bench_pipeline.py --sizes 1000 --shape diamond
+
+Save results with `--json` to compare runs before and after a change.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+
+from ruamel.yaml import YAML
+
+from synthetic import SHAPES, count_stages, dump_project, generate_project
+from simple_project_tool.mermaid_utilities import generate_mermaid
+from simple_project_tool.order_of_work import order_of_work
+from simple_project_tool.sort_utilities import topological_sort
+from simple_project_tool.yaml_utilities import get_validator, update_yaml
+
+STEPS = [
+    "parse",
+    "parse_round_trip",
+    "validate",
+    "sort",
+    "mermaid",
+    "order_of_work",
+    "update_yaml",
+]
+
+
+def load(path, *, typ=None):
+    yaml = YAML() if typ is None else YAML(typ=typ)
+    with open(path) as f:
+        return yaml.load(f)
+
+
+def time_steps(path):
+    """Returns {step: seconds} for one pass over the plan in `path`."""
+    timings = {}
+
+    @contextlib.contextmanager
+    def timed(step):
+        start = time.perf_counter()
+        yield
+        timings[step] = time.perf_counter() - start
+
+    with timed("parse"):
+        project = load(path, typ="safe")
+    with timed("parse_round_trip"):
+        round_trip_project = load(path)
+    validator = get_validator()
+    with timed("validate"):
+        errors = list(validator.iter_errors(project))
+    if errors:
+        raise ValueError(f"Generated plan is invalid: {errors[0].message}")
+    with timed("sort"):
+        sort_result = topological_sort(
+            project=project, complete_is_tree=True, updating_yaml=False
+        )
+    with timed("mermaid"):
+        generate_mermaid(
+            project=project,
+            complete_is_tree=True,
+            out=io.StringIO(),
+            sort_result=sort_result,
+        )
+    # The order of work and YAML update print to stdout.
+    with contextlib.redirect_stdout(io.StringIO()):
+        with timed("order_of_work"):
+            order_of_work(
+                project=project,
+                complete_is_tree=True,
+                incomplete_only=False,
+                sort_result=sort_result,
+            )
+        with timed("update_yaml"):
+            update_yaml(project=round_trip_project, complete_is_tree=True)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000]
+    )
+    parser.add_argument("--shape", choices=sorted(SHAPES), default="mixed")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--json", metavar="FILE", help="Also save the results here")
+    args = parser.parse_args()
+
+    print(f"{'stages':>7} " + " ".join(f"{step:>16}" for step in STEPS))
+    results = []
+    for size in args.sizes:
+        project = generate_project(shape=args.shape, stage_count=size, seed=args.seed)
+        stage_count = count_stages(project)
+        fd, path = tempfile.mkstemp(suffix=".yaml")
+        try:
+            with os.fdopen(fd, "w") as f:
+                dump_project(project, f)
+            runs = [time_steps(path) for _ in range(args.repeat)]
+        finally:
+            os.unlink(path)
+        best = {step: min(run[step] for run in runs) for step in STEPS}
+        print(
+            f"{stage_count:>7} "
+            + " ".join(f"{best[step] * 1000:16.1f}" for step in STEPS)
+        )
+        results.append({"stages": stage_count, "seconds": best})
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(
+                {"shape": args.shape, "seed": args.seed, "results": results},
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
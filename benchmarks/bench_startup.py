@@ -0,0 +1,72 @@
+"""Checks that `spt` starts quickly enough for editor and git hooks.
+
+Runs `spt --help` under `python -X importtime` and fails (exit status 1) if
+the entry point's cumulative import time is over budget, or if any of the
+heavy dependencies that only specific commands need were imported. Run from
+the repository root with:
+
+    PYTHONPATH=. python benchmarks/bench_startup.py
+"""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+# Cumulative import time allowed for simple_project_tool.generate, in
+# milliseconds. Currently around 15 ms; argparse accounts for most of it.
+IMPORT_BUDGET_MS = 40
+
+HEAVY_MODULES = ["rich", "jsonschema", "ruamel.yaml"]
+
+RUNS = 5
+
+
+def import_times():
+    """Returns {module: cumulative microseconds} for one cold `spt --help`."""
+    env = dict(os.environ, PYTHONPATH=str(Path(__file__).parent.parent))
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            "import sys; sys.argv = ['spt', '--help'];"
+            "from simple_project_tool.generate import main; main()",
+        ],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, module = line.split("|")
+        if cumulative.strip().isdigit():
+            times[module.strip()] = int(cumulative)
+    return times
+
+
+def main():
+    # Take the best of several runs to keep noise from failing the check.
+    runs = [import_times() for _ in range(RUNS)]
+    best_ms = min(run["simple_project_tool.generate"] for run in runs) / 1000
+    print(
+        f"simple_project_tool.generate: {best_ms:.1f} ms (budget {IMPORT_BUDGET_MS} ms)"
+    )
+
+    failed = False
+    if best_ms > IMPORT_BUDGET_MS:
+        print("Import time is over budget", file=sys.stderr)
+        failed = True
+    for module in HEAVY_MODULES:
+        if module in runs[0]:
+            print(f"{module} was imported by `spt --help`", file=sys.stderr)
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
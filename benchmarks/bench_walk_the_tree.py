@@ -0,0 +1,32 @@
+"""Times topological_sort on synthetic diamond lattices.
+
+Each layer is a group of parallel leaves where every leaf depends on two
+leaves of the previous layer, so the number of paths to the project grows
+exponentially with the number of layers. Run from the repository root with:
+
+    PYTHONPATH=. python benchmarks/bench_walk_the_tree.py
+"""
+
+import time
+
+from synthetic import diamond_lattice
+from simple_project_tool.sort_utilities import topological_sort
+
+
+def main():
+    width = 10
+    for layers in (10, 100, 1000, 3000):
+        project = diamond_lattice(layers=layers, width=width)
+        start = time.perf_counter()
+        _, by_title, _ = topological_sort(
+            project=project, complete_is_tree=True, updating_yaml=False
+        )
+        elapsed = time.perf_counter() - start
+        print(
+            f"{len(by_title):>7} stages: {elapsed * 1000:9.1f} ms "
+            f"({elapsed * 1e6 / len(by_title):.1f} us/stage)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""Generates synthetic project plans for the benchmarks.
+
+Every generator returns a valid project as plain dicts and lists, the same
+as the safe YAML loader produces, so plans can be fed straight to the
+library or written out as YAML. The shapes stress different parts of the
+pipeline:
+
+    chain    one long sequence of `stages`
+    fan      one group of wide `parallel_stages`
+    nested   sections of parallel groups, each a sequence of ten leaves
+    diamond  layers of parallel leaves, each depending on two of the layer
+             before, so the number of paths grows exponentially
+    mixed    phases in sequence, each a fan of teams working through nested
+             sequences, with `depends_on` links back to earlier phases and
+             random priority, complete, milestone and estimate flags
+
+To write a plan out, run from the repository root with, for example:
+
+    PYTHONPATH=. python benchmarks/synthetic.py mixed 10000 >plan.yaml
+"""
+
+import argparse
+import random
+import sys
+
+
+def chain(*, stage_count, seed=0):
+    stages = [{"title": f"Step {i}"} for i in range(stage_count)]
+    return {"title": "Chain", "stages": stages}
+
+
+def fan(*, stage_count, seed=0):
+    leaves = [{"title": f"Task {i}"} for i in range(stage_count)]
+    return {
+        "title": "Fan",
+        "stages": [{"title": "Everything at once", "parallel_stages": leaves}],
+    }
+
+
+def nested_groups(*, stage_count, seed=0):
+    sections = []
+    counter = 0
+    while counter < stage_count:
+        groups = []
+        for _ in range(10):
+            leaves = [{"title": f"Leaf {counter + i}"} for i in range(10)]
+            counter += len(leaves)
+            groups.append({"title": f"Group {counter}", "stages": leaves})
+        sections.append({"title": f"Section {counter}", "parallel_stages": groups})
+    return {"title": "Nested groups", "stages": sections}
+
+
+def diamond_lattice(*, layers, width):
+    stages = []
+    for layer in range(layers):
+        leaves = []
+        for column in range(width):
+            leaf = {"title": f"L{layer}C{column}"}
+            if layer > 0:
+                leaf["depends_on"] = [
+                    f"L{layer - 1}C{column}",
+                    f"L{layer - 1}C{(column + 1) % width}",
+                ]
+            if column == 0:
+                leaf["priority"] = layer
+            leaves.append(leaf)
+        stages.append({"title": f"Layer {layer}", "parallel_stages": leaves})
+    stages[-1]["complete"] = True
+    return {"title": "Diamond lattice", "stages": stages}
+
+
+def diamond(*, stage_count, seed=0):
+    width = 10
+    return diamond_lattice(layers=max(1, stage_count // (width + 1)), width=width)
+
+
+def mixed(*, stage_count, seed=0):
+    """Returns a plan mixing every shape, reproducible for a given `seed`.
+
+    Phases run in sequence and each holds a fan of teams. A team works
+    through a sequence of tasks, some of which are groups of sub-tasks two
+    levels deep. Tasks may depend on tasks of earlier phases, which keeps
+    the plan acyclic. Earlier phases are more likely to be complete.
+    """
+    rng = random.Random(seed)
+    phase_count = max(1, round(stage_count**0.5 / 4))
+    per_phase = max(1, stage_count // phase_count)
+    earlier_titles = []
+    counter = 0
+
+    def flags(stage, *, phase):
+        if rng.random() < 0.1:
+            stage["priority"] = rng.randint(1, 5)
+        if rng.random() < 0.05:
+            stage["milestone"] = True
+        if rng.random() < 0.5 * (1 - phase / phase_count):
+            stage["complete"] = True
+        if rng.random() < 0.3:
+            stage["estimate"] = rng.randint(1, 8)
+        if earlier_titles and rng.random() < 0.1:
+            stage["depends_on"] = rng.sample(
+                earlier_titles, min(len(earlier_titles), rng.randint(1, 2))
+            )
+        return stage
+
+    def task(*, phase, level):
+        nonlocal counter
+        counter += 1
+        stage = {"title": f"Task {counter}"}
+        if level < 2 and rng.random() < 0.1:
+            stage["stages"] = [
+                task(phase=phase, level=level + 1) for _ in range(rng.randint(2, 5))
+            ]
+        return flags(stage, phase=phase)
+
+    phases = []
+    for phase in range(phase_count):
+        phase_start = counter
+        titles = []
+        teams = []
+        while counter - phase_start < per_phase:
+            team_start = counter
+            tasks = [task(phase=phase, level=0) for _ in range(rng.randint(5, 20))]
+            teams.append(
+                flags({"title": f"Team {team_start}", "stages": tasks}, phase=phase)
+            )
+            titles.extend(f"Task {i}" for i in range(team_start + 1, counter + 1))
+        phases.append({"title": f"Phase {phase}", "parallel_stages": teams})
+        # Only later phases may depend on this one.
+        earlier_titles.extend(titles)
+    return {"title": "Mixed", "stages": phases}
+
+
+SHAPES = {
+    "chain": chain,
+    "fan": fan,
+    "nested": nested_groups,
+    "diamond": diamond,
+    "mixed": mixed,
+}
+
+
+def generate_project(*, shape, stage_count, seed=0):
+    """Returns a project of roughly `stage_count` stages in the given shape."""
+    return SHAPES[shape](stage_count=stage_count, seed=seed)
+
+
+def count_stages(project):
+    count = 0
+    pending = [project]
+    while pending:
+        stage = pending.pop()
+        count += 1
+        pending.extend(stage.get("stages", ()))
+        pending.extend(stage.get("parallel_stages", ()))
+    return count
+
+
+def dump_project(project, out):
+    """Writes a project as block style YAML, keeping each stage's key order."""
+    from ruamel.yaml import YAML
+
+    yaml = YAML(typ="safe")
+    yaml.default_flow_style = False
+    yaml.sort_base_mapping_type_on_output = False
+    yaml.dump(project, out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic project plan")
+    parser.add_argument("shape", choices=sorted(SHAPES))
+    parser.add_argument("stage_count", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    dump_project(
+        generate_project(
+            shape=args.shape, stage_count=args.stage_count, seed=args.seed
+        ),
+        sys.stdout,
+    )
+
+
+if __name__ == "__main__":
+    main()
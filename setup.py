@@ -14,7 +14,6 @@ setup(
         "jsonschema-specifications==2025.4.1",
         "markdown-it-py==3.0.0",
         "mdurl==0.1.2",
-        "networkx==3.5",
         "Pygments==2.19.1",
         "referencing==0.36.2",
         "rich==14.0.0",
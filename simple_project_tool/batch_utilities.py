@@ -0,0 +1,189 @@
+import argparse
+import contextlib
+import glob
+import io
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from .general_utilities import write_atomically
+
+
+def prepare_worker():
+    """Imports the rendering code and builds the schema validator once per process."""
+    from . import mermaid_utilities, order_of_work, sort_utilities  # noqa: F401
+    from .yaml_utilities import get_validator
+
+    get_validator()
+
+
+def output_base(*, yaml_file, out_dir):
+    """Returns the output path (without suffix) mirroring the file's relative path."""
+    relative = Path(os.path.relpath(Path(yaml_file).resolve(), Path.cwd()))
+    # Files outside the current directory are flattened to their name.
+    if relative.parts and relative.parts[0] == "..":
+        relative = Path(relative.name)
+    return Path(out_dir) / relative.with_suffix("")
+
+
+def render_file(yaml_file, out_dir, complete_is_tree, incomplete_only, cache_dir):
+    """Writes the Mermaid diagram and order of work for one project file.
+
+    Returns `(yaml_file, seconds, error)`, with `error` None on success.
+    Module level so it can run in a worker process.
+    """
+    from .include_utilities import compose_project
+    from .mermaid_utilities import iter_mermaid
+    from .order_of_work import iter_order_of_work_lines
+    from .sort_utilities import topological_sort
+
+    start = time.perf_counter()
+    messages = io.StringIO()
+    try:
+        # parse_yaml reports problems on stderr and exits, so capture both
+        # to record them against this file and carry on with the rest.
+        with contextlib.redirect_stderr(messages):
+            if cache_dir is not None:
+                from .cache_utilities import load_sorted_project
+
+                project, sort_result = load_sorted_project(
+                    yaml_file=yaml_file,
+                    complete_is_tree=complete_is_tree,
+                    cache_dir=cache_dir,
+                )
+            else:
+                project, _ = compose_project(yaml_file)
+                sort_result = topological_sort(
+                    project=project,
+                    complete_is_tree=complete_is_tree,
+                    updating_yaml=False,
+                )
+        base = output_base(yaml_file=yaml_file, out_dir=out_dir)
+        mermaid_lines = iter_mermaid(project=project, sort_result=sort_result)
+        write_atomically(
+            path=base.with_suffix(".mmd"),
+            data="".join(f"{line}\n" for line in mermaid_lines).encode(),
+        )
+        order_lines = iter_order_of_work_lines(
+            stages=sort_result[2], incomplete_only=incomplete_only
+        )
+        write_atomically(
+            path=base.with_suffix(".order.txt"),
+            data="".join(f"{line}\n" for line in order_lines).encode(),
+        )
+    except SystemExit:
+        # Keep the summary readable: the first line says what is wrong and
+        # the last says where (the schema dump in between is left out).
+        lines = [line for line in messages.getvalue().splitlines() if line.strip()]
+        error = "\n".join(dict.fromkeys([lines[0], lines[-1]])) if lines else ""
+        return yaml_file, time.perf_counter() - start, error or "Invalid project file"
+    except Exception as e:
+        return yaml_file, time.perf_counter() - start, f"{type(e).__name__}: {e}"
+    return yaml_file, time.perf_counter() - start, None
+
+
+def render_files(
+    *, yaml_files, out_dir, complete_is_tree, incomplete_only, cache_dir, jobs
+):
+    """Renders every file, yielding `render_file` results in file order."""
+    arguments = [
+        (yaml_file, out_dir, complete_is_tree, incomplete_only, cache_dir)
+        for yaml_file in yaml_files
+    ]
+    if jobs == 1:
+        prepare_worker()
+        for argument in arguments:
+            yield render_file(*argument)
+        return
+    with ProcessPoolExecutor(max_workers=jobs, initializer=prepare_worker) as pool:
+        yield from pool.map(render_file, *zip(*arguments))
+
+
+def batch_main(argv):
+    parser = argparse.ArgumentParser(
+        prog="spt batch",
+        description="Render the Mermaid diagram and order of work for many project files in one process",
+    )
+    parser.add_argument(
+        "patterns",
+        nargs="+",
+        help="Project files or glob patterns (quote them to use ** for subdirectories)",
+    )
+    parser.add_argument(
+        "--out-dir",
+        required=True,
+        help="Directory to write <file>.mmd and <file>.order.txt into, mirroring the files' relative paths",
+    )
+    parser.add_argument(
+        "-c",
+        "--complete-is-tree",
+        action="store_true",
+        help="Treat all stages required for a stage as completed if a stage is",
+    )
+    parser.add_argument(
+        "-i",
+        "--incomplete-only",
+        action="store_true",
+        help="Only show incomplete stages in the order of work",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of processes rendering files (default: one per CPU)",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Reuse parsed and sorted projects from the on-disk cache",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="Directory for --cache entries (default: $XDG_CACHE_HOME/simple-project-tool)",
+    )
+    args = parser.parse_args(argv)
+
+    yaml_files = []
+    for pattern in args.patterns:
+        matches = sorted(glob.glob(pattern, recursive=True))
+        if not matches:
+            print(f"No files match '{pattern}'.", file=sys.stderr)
+        yaml_files.extend(matches)
+    if not yaml_files:
+        sys.exit(1)
+    if args.jobs < 1:
+        print("The --jobs option must be at least 1.", file=sys.stderr)
+        sys.exit(1)
+
+    cache_dir = None
+    if args.cache:
+        from .cache_utilities import default_cache_dir
+
+        cache_dir = args.cache_dir or default_cache_dir()
+
+    start = time.perf_counter()
+    failures = 0
+    for yaml_file, seconds, error in render_files(
+        yaml_files=yaml_files,
+        out_dir=args.out_dir,
+        complete_is_tree=args.complete_is_tree,
+        incomplete_only=args.incomplete_only,
+        cache_dir=cache_dir,
+        jobs=min(args.jobs, len(yaml_files)),
+    ):
+        if error is None:
+            print(f"{seconds * 1000:9.1f} ms  ok      {yaml_file}")
+        else:
+            failures += 1
+            print(f"{seconds * 1000:9.1f} ms  FAILED  {yaml_file}")
+            for line in error.splitlines():
+                print(f"    {line}")
+    print(
+        f"\n{len(yaml_files) - failures} rendered, {failures} failed "
+        f"in {time.perf_counter() - start:.2f} s"
+    )
+    if failures:
+        sys.exit(1)
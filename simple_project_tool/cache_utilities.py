@@ -0,0 +1,195 @@
+import functools
+import hashlib
+import os
+import pickle
+import sys
+from array import array
+from importlib.metadata import version, PackageNotFoundError
+from pathlib import Path
+
+from .dag_utilities import StageGraph
+from .general_utilities import write_atomically
+
+# Bump this whenever the layout of cache entries changes. Entries are also
+# keyed on the package's source (see `source_digest`), which catches code
+# changes made without a bump.
+CACHE_FORMAT = 3
+
+
+def default_cache_dir():
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "simple-project-tool"
+
+
+def tool_version():
+    try:
+        return version("simple-project-tool")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+@functools.cache
+def source_digest():
+    """Returns a hash of the package's own source files.
+
+    Part of every cache key, so changing how projects are parsed, sorted
+    or stored invalidates earlier entries even when the version number
+    stays the same, as it does in a checkout or an editable install.
+    """
+    digest = hashlib.sha256()
+    for path in sorted(Path(__file__).parent.glob("*.py")):
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_entry_path(*, cache_dir, parts):
+    key = hashlib.sha256(
+        "\0".join([str(CACHE_FORMAT), tool_version(), source_digest(), *parts]).encode()
+    ).hexdigest()
+    return Path(cache_dir) / f"{key}.pickle"
+
+
+def read_entry(entry_path):
+    """Returns a cache entry, or None if it is missing or cannot be read."""
+    try:
+        with open(entry_path, "rb") as f:
+            return pickle.load(f)
+    except Exception:
+        # Missing, corrupt or incompatible entries are all treated as a miss.
+        return None
+
+
+def write_entry(entry_path, entry):
+    try:
+        write_atomically(
+            path=entry_path,
+            data=pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL),
+        )
+    except OSError as e:
+        print(f"Could not write cache entry: {e}", file=sys.stderr)
+
+
+def load_cached_document(*, yaml_file, cache_dir=None):
+    """Returns the validated contents of a single YAML file, parsing it only on a miss.
+
+    Entries are keyed on the file's content hash, so composed projects only
+    re-parse the files that changed.
+    """
+    if cache_dir is None:
+        cache_dir = default_cache_dir()
+    entry_path = cache_entry_path(
+        cache_dir=cache_dir, parts=["document", file_digest(yaml_file)]
+    )
+    document = read_entry(entry_path)
+    if document is None:
+        from .yaml_utilities import parse_yaml
+
+        document = parse_yaml(yaml_file, round_trip=False)
+        write_entry(entry_path, document)
+    return document
+
+
+def pack_sort_result(*, project, sort_result):
+    G, by_title, stages = sort_result
+    edges = array("I")
+    for from_id, successors in enumerate(G.successors):
+        for to_id in successors:
+            edges.append(from_id)
+            edges.append(to_id)
+    # The stages hold everything the outputs need, so only the project's
+    # title is kept rather than the whole document.
+    return {
+        "project": {"title": project["title"]},
+        "stages": stages,
+        "nodes": G.titles,
+        "edges": edges,
+    }
+
+
+def unpack_sort_result(entry):
+    G = StageGraph()
+    nodes = entry["nodes"]
+    for node in nodes:
+        G.add_node(node)
+    edges = entry["edges"]
+    for i in range(0, len(edges), 2):
+        G.add_edge(nodes[edges[i]], nodes[edges[i + 1]])
+    stages = entry["stages"]
+    by_title = {stage.title: stage for stage in stages}
+    return entry["project"], (G, by_title, stages)
+
+
+def load_sorted_project(
+    *, yaml_file, complete_is_tree, cache_dir=None, with_index=False
+):
+    """Parses, validates and sorts a project, reusing a cached result when possible.
+
+    Entries are keyed on the file's content hash, the tool version and
+    `complete_is_tree`, and hold the project's stages in order together with
+    the edge list. Included files are recorded with their hashes and checked
+    on every hit. Returns `(project, (G, by_title, stages))`, where `project`
+    only has the project's title and the rest is in the same form as
+    `topological_sort`.
+
+    With `with_index` set, `(project, (G, by_title, stages), index)` is
+    returned, with the project's `QueryIndex`. It is built the first time it
+    is asked for and kept in the same entry.
+    """
+    if cache_dir is None:
+        cache_dir = default_cache_dir()
+    entry_path = cache_entry_path(
+        cache_dir=cache_dir,
+        parts=["sorted", file_digest(yaml_file), str(bool(complete_is_tree))],
+    )
+    entry = read_entry(entry_path)
+    if entry is not None and all(
+        included_digest == file_digest_or_none(included_file)
+        for included_file, included_digest in entry["included"]
+    ):
+        project, sort_result = unpack_sort_result(entry)
+        if not with_index:
+            return project, sort_result
+        return project, sort_result, index_entry(entry_path, entry, sort_result)
+
+    # Parsing and sorting are only needed on a miss, so their dependencies are
+    # not imported on a hit.
+    from .include_utilities import compose_project
+    from .sort_utilities import topological_sort
+
+    project, files = compose_project(yaml_file, cache_dir=cache_dir)
+    sort_result = topological_sort(
+        project=project, complete_is_tree=complete_is_tree, updating_yaml=False
+    )
+    entry = pack_sort_result(project=project, sort_result=sort_result)
+    entry["included"] = [(str(path), file_digest(path)) for path in files[1:]]
+    if with_index:
+        index = index_entry(entry_path, entry, sort_result)
+        return entry["project"], sort_result, index
+    write_entry(entry_path, entry)
+    return entry["project"], sort_result
+
+
+def index_entry(entry_path, entry, sort_result):
+    """Returns the query index for a sorted entry, saving it in the entry if new."""
+    if "index" not in entry:
+        from .query_utilities import QueryIndex
+
+        entry["index"] = QueryIndex(sort_result=sort_result)
+        write_entry(entry_path, entry)
+    return entry["index"]
+
+
+def file_digest_or_none(path):
+    try:
+        return file_digest(path)
+    except OSError:
+        return None
@@ -0,0 +1,182 @@
+import argparse
+import sys
+
+from .general_utilities import open_atomically
+
+
+def load_with_nodes(yaml_file):
+    """Loads and validates a project, also returning the YAML node of every stage.
+
+    The document is composed once with the fast safe parser, whose nodes
+    record where each value starts and ends, and the project is built from
+    those nodes. Returns `(project, stage_nodes)`, with `stage_nodes`
+    mapping each title to its mapping node. Exits with a message if the
+    project is invalid.
+    """
+    from ruamel.yaml import YAML
+    from jsonschema.exceptions import best_match
+    from .yaml_utilities import get_validator, parse_yaml
+
+    yaml = YAML(typ="safe")
+    with open(yaml_file) as f:
+        root = yaml.compose(f)
+    project = yaml.constructor.construct_document(root)
+    if best_match(get_validator().iter_errors(project)) is not None:
+        # Re-read in round-trip mode to report the error with its line.
+        parse_yaml(yaml_file, round_trip=True)
+
+    stage_nodes = {}
+    # Visited in the same order as `sort_stage`, so duplicate titles resolve
+    # the same way.
+    pending = [root]
+    while pending:
+        node = pending.pop()
+        values = {key.value: value for key, value in node.value}
+        stage_nodes[values["title"].value] = node
+        for key in ("parallel_stages", "stages"):
+            if key in values:
+                pending.extend(reversed(values[key].value))
+    return project, stage_nodes
+
+
+def stages_to_complete(*, G, by_title, titles):
+    """Returns the titles that become complete when `titles` are completed.
+
+    Following the complete_is_tree rules, everything a complete stage
+    depends on is complete too, so these are the given stages and every
+    stage they depend on, directly or not. Only that part of the graph is
+    visited, which must have passed `validate_graph`.
+    """
+    for title in titles:
+        if title not in by_title:
+            raise ValueError(f"There is no stage titled '{title}'.")
+    seen = set(titles)
+    pending = list(titles)
+    while pending:
+        for from_id in G.predecessors[G.ids[pending.pop()]]:
+            from_title = G.titles[from_id]
+            if from_title not in seen:
+                seen.add(from_title)
+                pending.append(from_title)
+    return [title for title in G.titles if title in seen]
+
+
+def completion_edit(node):
+    """Returns the edit marking the stage at `node` complete, or None if it already is.
+
+    Edits are `(line, start_column, end_column, text)` to replace part of an
+    existing line, or `(line, None, None, text)` to insert a new line before
+    `line` (0-based).
+    """
+    if node.flow_style:
+        raise ValueError(
+            f"Line {node.start_mark.line + 1}: stages written in flow style "
+            "({...}) cannot be updated in place."
+        )
+    values = {key.value: (key, value) for key, value in node.value}
+    if "complete" in values:
+        _, value = values["complete"]
+        if value.value in ("true", "True", "TRUE"):
+            return None
+        if value.start_mark.line != value.end_mark.line:
+            raise ValueError(
+                f"Line {value.start_mark.line + 1}: cannot update a complete "
+                "value spread over several lines."
+            )
+        return (
+            value.start_mark.line,
+            value.start_mark.column,
+            value.end_mark.column,
+            "true",
+        )
+    title_key, title_value = values["title"]
+    # Insert after the title, including any continuation lines. Block
+    # scalars end at the start of the line after their text.
+    end = title_value.end_mark
+    line = end.line if end.column == 0 else end.line + 1
+    return (line, None, None, " " * title_key.start_mark.column + "complete: true")
+
+
+def apply_edits(*, lines, edits):
+    """Applies `completion_edit` edits to a list of lines (with line endings)."""
+    newline = "\n"
+    if lines and lines[0].endswith("\r\n"):
+        newline = "\r\n"
+    # From the bottom up, so earlier edits do not move the later ones.
+    for line, start, end, text in sorted(
+        edits, key=lambda edit: (edit[0], edit[1] is not None), reverse=True
+    ):
+        if start is None:
+            if line > 0 and not lines[line - 1].endswith("\n"):
+                lines[line - 1] += newline
+            lines.insert(line, text + newline)
+        else:
+            lines[line] = lines[line][:start] + text + lines[line][end:]
+    return lines
+
+
+def complete_stages(*, yaml_file, titles):
+    """Marks stages complete in the file, changing only the lines that need it.
+
+    Returns the titles of the stages that were changed.
+    """
+    from .dag_utilities import StageGraph
+    from .sort_utilities import sort_stage
+    from .validation_utilities import validate_graph
+
+    project, stage_nodes = load_with_nodes(yaml_file)
+    if "include" in project:
+        raise ValueError(
+            "Projects using include cannot be updated in place; "
+            "update the included files individually."
+        )
+    G = StageGraph()
+    by_title = {}
+    sort_stage(G=G, by_title=by_title, parent_stage=None, stage=project, parallel=False)
+    validate_graph(G=G, by_title=by_title, project=project)
+
+    edits = {}
+    for title in stages_to_complete(G=G, by_title=by_title, titles=titles):
+        edit = completion_edit(stage_nodes[title])
+        if edit is not None:
+            edits[title] = edit
+    if not edits:
+        return []
+
+    with open(yaml_file, newline="") as f:
+        lines = f.readlines()
+    apply_edits(lines=lines, edits=edits.values())
+    with open_atomically(yaml_file) as out:
+        out.writelines(lines)
+    return list(edits)
+
+
+def complete_main(argv):
+    parser = argparse.ArgumentParser(
+        prog="spt complete",
+        description="Mark stages complete in the YAML file, along with every stage they depend on, changing only those lines",
+    )
+    parser.add_argument("titles", nargs="+", help="Titles of the stages to complete")
+    parser.add_argument(
+        "-f",
+        "--file",
+        default="project.yaml",
+        help="YAML project file (default: project.yaml)",
+    )
+    args = parser.parse_args(argv)
+
+    from .validation_utilities import ProjectValidationError, print_validation_error
+
+    try:
+        changed = complete_stages(yaml_file=args.file, titles=args.titles)
+    except ProjectValidationError as e:
+        print_validation_error(e, yaml_file=args.file)
+        sys.exit(1)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    if not changed:
+        print("Nothing to change, those stages are already complete.")
+        return
+    for title in changed:
+        print(f"Completed: {title}")
@@ -0,0 +1,247 @@
+import heapq
+from array import array
+
+
+class StageGraph:
+    """A compact directed graph of stage titles.
+
+    Titles are interned to integer ids in the order they are first seen and
+    adjacency is kept as arrays of ids, one per node, in edge insertion
+    order. The title-based methods mirror the parts of `networkx.DiGraph`
+    the tool used, so callers can keep working in titles while the
+    algorithms below work on ids.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.titles = []
+        self.successors = []
+        self.predecessors = []
+        # Packed (from_id, to_id) pairs, so repeated edges are only added once.
+        self._edge_keys = set()
+
+    def __len__(self):
+        return len(self.titles)
+
+    def __contains__(self, title):
+        return title in self.ids
+
+    def add_node(self, title):
+        node_id = self.ids.get(title)
+        if node_id is None:
+            node_id = len(self.titles)
+            self.ids[title] = node_id
+            self.titles.append(title)
+            self.successors.append(array("l"))
+            self.predecessors.append(array("l"))
+        return node_id
+
+    def add_edge(self, from_title, to_title):
+        from_id = self.add_node(from_title)
+        to_id = self.add_node(to_title)
+        edge_key = (from_id << 32) | to_id
+        if edge_key in self._edge_keys:
+            return
+        self._edge_keys.add(edge_key)
+        self.successors[from_id].append(to_id)
+        self.predecessors[to_id].append(from_id)
+
+    @property
+    def nodes(self):
+        return list(self.titles)
+
+    @property
+    def edges(self):
+        titles = self.titles
+        return [
+            (titles[from_id], titles[to_id])
+            for from_id, successors in enumerate(self.successors)
+            for to_id in successors
+        ]
+
+    def in_edges(self, title):
+        titles = self.titles
+        return [
+            (titles[from_id], title) for from_id in self.predecessors[self.ids[title]]
+        ]
+
+    def out_edges(self, title):
+        titles = self.titles
+        return [(title, titles[to_id]) for to_id in self.successors[self.ids[title]]]
+
+    def topological_order(self):
+        """Returns node ids in a topological order (Kahn's algorithm)."""
+        indegree = array("l", (len(p) for p in self.predecessors))
+        ready = [node_id for node_id, degree in enumerate(indegree) if degree == 0]
+        order = []
+        while ready:
+            node_id = ready.pop()
+            order.append(node_id)
+            for child_id in self.successors[node_id]:
+                indegree[child_id] -= 1
+                if indegree[child_id] == 0:
+                    ready.append(child_id)
+        if len(order) != len(self.titles):
+            raise ValueError("Graph contains a cycle.")
+        return order
+
+    def strongly_connected_components(self, *, successors=None):
+        """Yields the strongly connected components as lists of node ids.
+
+        Uses Tarjan's algorithm with an explicit stack, so it runs in linear
+        time however long the chains are. Every node is in exactly one
+        component; a component of more than one node, or of a node with an
+        edge to itself, is a cycle. `successors` can replace the graph's
+        adjacency, for example to leave some edges out.
+        """
+        if successors is None:
+            successors = self.successors
+        node_count = len(self.titles)
+        index = array("l", [-1]) * node_count
+        lowlink = array("l", [0]) * node_count
+        on_stack = bytearray(node_count)
+        stack = []
+        next_index = 0
+        for root in range(node_count):
+            if index[root] != -1:
+                continue
+            # Each entry is (node_id, position of the next successor to visit)
+            work = [(root, 0)]
+            while work:
+                node_id, position = work.pop()
+                if position == 0:
+                    index[node_id] = lowlink[node_id] = next_index
+                    next_index += 1
+                    stack.append(node_id)
+                    on_stack[node_id] = 1
+                children = successors[node_id]
+                while position < len(children):
+                    child_id = children[position]
+                    position += 1
+                    if index[child_id] == -1:
+                        # Come back to this node once the child is done.
+                        work.append((node_id, position))
+                        work.append((child_id, 0))
+                        break
+                    if on_stack[child_id] and index[child_id] < lowlink[node_id]:
+                        lowlink[node_id] = index[child_id]
+                else:
+                    if lowlink[node_id] == index[node_id]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack[member] = 0
+                            component.append(member)
+                            if member == node_id:
+                                break
+                        yield component
+                    if work:
+                        parent_id = work[-1][0]
+                        if lowlink[node_id] < lowlink[parent_id]:
+                            lowlink[parent_id] = lowlink[node_id]
+
+    def find_cycle(self, component, *, successors=None):
+        """Returns node ids forming one cycle through a strongly connected component.
+
+        The cycle starts and ends at the component's first node, which is
+        repeated at the end. `successors` is as for
+        `strongly_connected_components`.
+        """
+        if successors is None:
+            successors = self.successors
+        members = set(component)
+        start = component[0]
+        # Breadth-first search within the component for a path back to start.
+        came_from = {start: None}
+        frontier = [start]
+        while frontier:
+            next_frontier = []
+            for node_id in frontier:
+                for child_id in successors[node_id]:
+                    if child_id == start:
+                        path = [start]
+                        while node_id is not None:
+                            path.append(node_id)
+                            node_id = came_from[node_id]
+                        path.reverse()
+                        return path
+                    if child_id in members and child_id not in came_from:
+                        came_from[child_id] = node_id
+                        next_frontier.append(child_id)
+            frontier = next_frontier
+        return []
+
+    def transitive_reduction(self):
+        """Returns each node's successors with every redundant edge left out.
+
+        An edge is redundant when its target can also be reached through
+        another successor of the same node. Nodes are ranked by the longest
+        path leading to them, so a node only ever reaches nodes of a higher
+        rank. A node's successors are taken in rank order and a depth-first
+        search from each one that is kept marks everything it reaches, which
+        is then dropped as it comes up. The searches never enter nodes
+        ranked as high as the highest successor, as those cannot lead to
+        one. The kept successors stay in edge insertion order.
+        """
+        successors = self.successors
+        rank = array("l", [0]) * len(successors)
+        for node_id in self.topological_order():
+            for child_id in successors[node_id]:
+                if rank[child_id] <= rank[node_id]:
+                    rank[child_id] = rank[node_id] + 1
+        # The node whose search last reached each node.
+        reached_from = array("l", [-1]) * len(successors)
+        reduced = []
+        for node_id, children in enumerate(successors):
+            if len(children) < 2:
+                reduced.append(children)
+                continue
+            children_in_order = sorted(children, key=rank.__getitem__)
+            limit = rank[children_in_order[-1]]
+            kept = set()
+            for child_id in children_in_order:
+                if reached_from[child_id] == node_id:
+                    continue
+                kept.add(child_id)
+                if rank[child_id] == limit:
+                    continue
+                pending = [child_id]
+                while pending:
+                    for next_id in successors[pending.pop()]:
+                        if reached_from[next_id] != node_id:
+                            reached_from[next_id] = node_id
+                            if rank[next_id] < limit:
+                                pending.append(next_id)
+            if len(kept) == len(children):
+                reduced.append(children)
+            else:
+                reduced.append(
+                    array("l", (child_id for child_id in children if child_id in kept))
+                )
+        return reduced
+
+    def lexicographical_topological_sort(self, *, key):
+        """Returns titles in topological order, taking the smallest `key` first.
+
+        Ties are broken by the order nodes were added, which matches
+        `networkx.lexicographical_topological_sort`.
+        """
+        titles = self.titles
+        indegree = array("l", (len(p) for p in self.predecessors))
+        ready = [
+            (key(titles[node_id]), node_id)
+            for node_id, degree in enumerate(indegree)
+            if degree == 0
+        ]
+        heapq.heapify(ready)
+        order = []
+        while ready:
+            _, node_id = heapq.heappop(ready)
+            order.append(titles[node_id])
+            for child_id in self.successors[node_id]:
+                indegree[child_id] -= 1
+                if indegree[child_id] == 0:
+                    heapq.heappush(ready, (key(titles[child_id]), child_id))
+        if len(order) != len(titles):
+            raise ValueError("Graph contains a cycle.")
+        return order
@@ -0,0 +1,235 @@
+import csv
+import json
+import sys
+from xml.sax.saxutils import escape
+
+from .general_utilities import flush_if_possible, write_lines
+from .order_of_work import iter_order_of_work
+from .profile_utilities import phase
+
+ORDER_FORMATS = ("json", "ndjson", "csv")
+GRAPH_FORMATS = ("json", "ndjson", "graphml")
+
+# Fields of each stage record, in output order
+ORDER_FIELDS = (
+    "position",
+    "title",
+    "kind",
+    "milestone",
+    "complete",
+    "priority",
+    "parent",
+)
+
+# GraphML attribute types for the graph fields after `id`
+GRAPHML_TYPES = {
+    "title": "string",
+    "kind": "string",
+    "milestone": "boolean",
+    "complete": "boolean",
+    "priority": "double",
+    "parent": "string",
+}
+
+
+def stage_kind(stage):
+    if stage.parent == -1:
+        return "project"
+    return "leaf" if stage.leaf else "group"
+
+
+def parent_title(stage, *, G):
+    return None if stage.parent == -1 else G.titles[stage.parent]
+
+
+def order_record(*, position, stage, kind, G):
+    """Returns the order of work entry for a stage as a plain dict."""
+    return {
+        "position": position,
+        "title": stage.title,
+        "kind": kind,
+        "milestone": stage.milestone,
+        "complete": stage.complete,
+        "priority": stage.priority,
+        "parent": parent_title(stage, G=G),
+    }
+
+
+def graph_record(*, stage, G):
+    """Returns a stage of the graph, with its inherited priority and completion, as a plain dict."""
+    return {
+        "id": stage.node_id,
+        "title": stage.title,
+        "kind": stage_kind(stage),
+        "milestone": stage.milestone,
+        "complete": stage.complete,
+        "priority": stage.priority,
+        "parent": parent_title(stage, G=G),
+    }
+
+
+def iter_json_array(records, *, indent="", end=""):
+    """Yields a JSON array one record per line, without holding the records in memory.
+
+    `end` is added after the closing bracket, such as a comma when the array
+    is a value in an enclosing object.
+    """
+    yield "["
+    previous = None
+    for record in records:
+        if previous is not None:
+            yield f"{indent}  {previous},"
+        previous = json.dumps(record, ensure_ascii=False)
+    if previous is not None:
+        yield f"{indent}  {previous}"
+    yield f"{indent}]{end}"
+
+
+def iter_order_records(*, sort_result, incomplete_only):
+    G, _, stages = sort_result
+    for position, stage, kind in iter_order_of_work(
+        stages=stages, incomplete_only=incomplete_only
+    ):
+        yield order_record(position=position, stage=stage, kind=kind, G=G)
+
+
+def iter_graph_records(*, sort_result):
+    G, by_title, _ = sort_result
+    for title in G.titles:
+        yield graph_record(stage=by_title[title], G=G)
+
+
+def iter_edge_records(*, G):
+    for from_id, successors in enumerate(G.successors):
+        for to_id in successors:
+            yield {"from": from_id, "to": to_id}
+
+
+def iter_order_of_work_export(*, sort_result, incomplete_only, format):
+    """Yields the order of work as JSON or newline-delimited JSON lines."""
+    records = iter_order_records(
+        sort_result=sort_result, incomplete_only=incomplete_only
+    )
+    if format == "json":
+        yield from iter_json_array(records)
+    elif format == "ndjson":
+        for record in records:
+            yield json.dumps(record, ensure_ascii=False)
+    else:
+        raise ValueError(f"Unsupported order of work format '{format}'.")
+
+
+def iter_graph_export(*, project, sort_result, format):
+    """Yields the stage graph as JSON, newline-delimited JSON or GraphML lines.
+
+    Stages are identified by their node id, edges point from a stage to the
+    stage depending on it. Newline-delimited JSON gives every stage then
+    every edge, each record tagged with its `type`.
+    """
+    G = sort_result[0]
+    nodes = iter_graph_records(sort_result=sort_result)
+    edges = iter_edge_records(G=G)
+    if format == "json":
+        yield "{"
+        yield f'  "project": {json.dumps(project["title"], ensure_ascii=False)},'
+        nodes_lines = iter_json_array(nodes, indent="  ", end=",")
+        yield f'  "nodes": {next(nodes_lines)}'
+        yield from nodes_lines
+        edges_lines = iter_json_array(edges, indent="  ")
+        yield f'  "edges": {next(edges_lines)}'
+        yield from edges_lines
+        yield "}"
+    elif format == "ndjson":
+        for record in nodes:
+            yield json.dumps({"type": "stage", **record}, ensure_ascii=False)
+        for record in edges:
+            yield json.dumps({"type": "edge", **record})
+    elif format == "graphml":
+        yield from iter_graphml(nodes=nodes, edges=edges)
+    else:
+        raise ValueError(f"Unsupported graph format '{format}'.")
+
+
+def iter_graphml(*, nodes, edges):
+    yield '<?xml version="1.0" encoding="UTF-8"?>'
+    yield '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">'
+    for name, type_name in GRAPHML_TYPES.items():
+        yield (
+            f'  <key id="{name}" for="node" attr.name="{name}" '
+            f'attr.type="{type_name}"/>'
+        )
+    yield '  <graph id="stages" edgedefault="directed">'
+    for record in nodes:
+        yield f'    <node id="n{record["id"]}">'
+        for name in GRAPHML_TYPES:
+            value = record[name]
+            if value is None:
+                continue
+            if isinstance(value, bool):
+                value = "true" if value else "false"
+            yield f'      <data key="{name}">{escape(str(value))}</data>'
+        yield "    </node>"
+    for record in edges:
+        yield f'    <edge source="n{record["from"]}" target="n{record["to"]}"/>'
+    yield "  </graph>"
+    yield "</graphml>"
+
+
+def write_order_of_work_csv(*, out, sort_result, incomplete_only):
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(ORDER_FIELDS)
+    for record in iter_order_records(
+        sort_result=sort_result, incomplete_only=incomplete_only
+    ):
+        writer.writerow([csv_value(record[field]) for field in ORDER_FIELDS])
+    flush_if_possible(out)
+
+
+def csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return value
+
+
+def export_order_of_work(
+    *, project, complete_is_tree, incomplete_only, format, out=None, sort_result=None
+):
+    """Writes the order of work as `json`, `ndjson` or `csv` records to `out`."""
+    out = sys.stdout if out is None else out
+    from .sort_utilities import sorted_project
+
+    sort_result = sorted_project(
+        project=project, complete_is_tree=complete_is_tree, sort_result=sort_result
+    )
+    with phase("export"):
+        if format == "csv":
+            write_order_of_work_csv(
+                out=out, sort_result=sort_result, incomplete_only=incomplete_only
+            )
+            return
+        write_lines(
+            out=out,
+            lines=iter_order_of_work_export(
+                sort_result=sort_result,
+                incomplete_only=incomplete_only,
+                format=format,
+            ),
+        )
+
+
+def export_graph(*, project, complete_is_tree, format, out=None, sort_result=None):
+    """Writes the stage graph as `json`, `ndjson` or `graphml` to `out`."""
+    from .sort_utilities import sorted_project
+
+    sort_result = sorted_project(
+        project=project, complete_is_tree=complete_is_tree, sort_result=sort_result
+    )
+    with phase("export"):
+        write_lines(
+            out=sys.stdout if out is None else out,
+            lines=iter_graph_export(
+                project=project, sort_result=sort_result, format=format
+            ),
+        )
@@ -0,0 +1,194 @@
+import sys
+from .general_utilities import (
+    write_lines,
+    AlphaLabelGenerator,
+    NodeRefGenerator,
+)
+from .profile_utilities import phase
+from .mermaid_utilities import (
+    SubGraph,
+    generate_mermaid_leaf_declaration,
+    iter_mermaid_styles,
+    node_ref,
+)
+
+UPSTREAM_REF = "Hidden_upstream"
+DOWNSTREAM_REF = "Hidden_downstream"
+
+
+def focus_subgraph(*, G, title, depth=None, upstream=True, downstream=True):
+    """Returns the ids of the stages within `depth` edges of `title`.
+
+    Upstream follows edges back to the stages `title` depends on (which
+    includes its sub-stages), downstream follows them forward to the stages
+    depending on it. A `depth` of None means no limit. Only the stages
+    returned are ever visited.
+    """
+    if title not in G.ids:
+        raise ValueError(f"There is no stage titled '{title}' to focus on.")
+    focus_id = G.ids[title]
+    kept = {focus_id}
+    directions = []
+    if upstream:
+        directions.append(G.predecessors)
+    if downstream:
+        directions.append(G.successors)
+    for neighbours in directions:
+        frontier = [focus_id]
+        level = 0
+        while frontier and (depth is None or level < depth):
+            level += 1
+            next_frontier = []
+            for node_id in frontier:
+                for neighbour_id in neighbours[node_id]:
+                    if neighbour_id not in kept:
+                        kept.add(neighbour_id)
+                        next_frontier.append(neighbour_id)
+            frontier = next_frontier
+    # Node ids follow the order stages were added, so this keeps the
+    # project file's order.
+    return sorted(kept)
+
+
+def iter_focused_mermaid(
+    *, project, sort_result, title, depth=None, upstream=True, downstream=True
+):
+    """Yields a Mermaid diagram of just the stages around `title`.
+
+    Stages outside the focus are collapsed into two summary nodes, one for
+    the hidden stages feeding into the focus and one for those it feeds.
+    Each counts the hidden stages next to a stage that is shown, so the
+    work stays in proportion to the stages drawn.
+    """
+    G, by_title, stages = sort_result
+    kept_ids = focus_subgraph(
+        G=G, title=title, depth=depth, upstream=upstream, downstream=downstream
+    )
+    kept_ids_set = set(kept_ids)
+    kept = [by_title[G.titles[node_id]] for node_id in kept_ids]
+    project_id = G.ids[project["title"]]
+
+    alpha_label_generator = AlphaLabelGenerator()
+    group_id_generator = NodeRefGenerator(prefix="Group_")
+    top_leaf_ref_generator = NodeRefGenerator(prefix=alpha_label_generator.next())
+    yield "flowchart BT"
+    if project_id in kept_ids_set:
+        yield f'Project(["{project["title"]}"])'
+        yield ""
+        yield "style Project fill:#AC36BC,stroke:#333,stroke-width:2px,color:#fff"
+        yield ""
+
+    # Groups whose parent is shown nest inside it, the rest go at the top.
+    sub_graphs = {}
+    for stage in kept:
+        if stage.node_id != project_id and not stage.leaf:
+            sub_graph = SubGraph(
+                stage=stage,
+                leaf_ref_generator=NodeRefGenerator(alpha_label_generator.next()),
+                group_id=group_id_generator.next(),
+            )
+            stage.sub_graph = sub_graph
+            sub_graphs[stage.node_id] = sub_graph
+    top_level_sub_graphs = []
+    top_level_leaves = []
+    for stage in kept:
+        if stage.node_id == project_id:
+            continue
+        parent_sub_graph = sub_graphs.get(stage.parent)
+        if stage.leaf:
+            if parent_sub_graph is None:
+                top_level_leaves.append(stage)
+            else:
+                parent_sub_graph.add_stage(stage)
+        elif parent_sub_graph is None:
+            top_level_sub_graphs.append(sub_graphs[stage.node_id])
+        else:
+            parent_sub_graph.add_sub_graph(sub_graphs[stage.node_id])
+
+    for sub_graph in sub_graphs.values():
+        sub_graph.assign_leaf_refs()
+    for stage in top_level_leaves:
+        yield generate_mermaid_leaf_declaration(
+            stage=stage, leaf_ref_generator=top_leaf_ref_generator
+        )
+    if top_level_leaves:
+        yield ""
+    for sub_graph in top_level_sub_graphs:
+        yield from sub_graph.iter_mermaid_lines()
+        yield ""
+
+    def ref(stage):
+        return "Project" if stage.node_id == project_id else node_ref(stage)
+
+    edges = []
+    hidden_upstream = set()
+    hidden_downstream = set()
+    for node_id, stage in zip(kept_ids, kept):
+        hidden = [i for i in G.predecessors[node_id] if i not in kept_ids_set]
+        if hidden:
+            hidden_upstream.update(hidden)
+            edges.append(f"{UPSTREAM_REF} --> {ref(stage)}")
+        for to_id in G.successors[node_id]:
+            if to_id in kept_ids_set:
+                edges.append(f"{ref(stage)} --> {ref(by_title[G.titles[to_id]])}")
+        hidden = [i for i in G.successors[node_id] if i not in kept_ids_set]
+        if hidden:
+            hidden_downstream.update(hidden)
+            edges.append(f"{ref(stage)} --> {DOWNSTREAM_REF}")
+
+    for summary_ref, hidden, direction in (
+        (UPSTREAM_REF, hidden_upstream, "upstream"),
+        (DOWNSTREAM_REF, hidden_downstream, "downstream"),
+    ):
+        if hidden:
+            count = len(hidden)
+            yield (
+                f'{summary_ref}[["{count} hidden '
+                f'neighbour{"s" if count != 1 else ""} {direction}"]]'
+            )
+    if hidden_upstream or hidden_downstream:
+        yield ""
+    yield from edges
+    yield ""
+
+    for summary_ref, hidden in (
+        (UPSTREAM_REF, hidden_upstream),
+        (DOWNSTREAM_REF, hidden_downstream),
+    ):
+        if hidden:
+            yield f"style {summary_ref} fill:#EEEEEE,stroke:#999,stroke-dasharray:5 5"
+    yield from iter_mermaid_styles(
+        stages=[stage for stage in kept if stage.node_id != project_id],
+        node_ref_of=ref,
+    )
+
+
+def generate_focused_mermaid(
+    *,
+    project,
+    complete_is_tree,
+    title,
+    depth=None,
+    upstream=True,
+    downstream=True,
+    out=None,
+    sort_result=None,
+):
+    """Writes the Mermaid diagram around `title` to `out` (stdout by default)."""
+    from .sort_utilities import sorted_project
+
+    sort_result = sorted_project(
+        project=project, complete_is_tree=complete_is_tree, sort_result=sort_result
+    )
+    with phase("mermaid"):
+        write_lines(
+            out=sys.stdout if out is None else out,
+            lines=iter_focused_mermaid(
+                project=project,
+                sort_result=sort_result,
+                title=title,
+                depth=depth,
+                upstream=upstream,
+                downstream=downstream,
+            ),
+        )
@@ -1,3 +1,8 @@
+import contextlib
+import os
+import tempfile
+from pathlib import Path
+
 INDENT_SPACES = 4
 
 
@@ -32,3 +37,64 @@ class NodeRefGenerator:
         label = f"{self.prefix}{self.n}"
         self.n += 1
         return label
+
+
+def write_lines(*, out, lines, chunk_size=1024):
+    """Writes lines to a text sink, adding line endings.
+
+    Lines are joined into chunks so that unbuffered sinks, such as sockets,
+    see a few large writes rather than one per line. The sink is flushed at
+    the end if it has a `flush` method.
+    """
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= chunk_size:
+            chunk.append("")
+            out.write("\n".join(chunk))
+            chunk = []
+    if chunk:
+        chunk.append("")
+        out.write("\n".join(chunk))
+    flush_if_possible(out)
+
+
+def flush_if_possible(out):
+    """Flushes a text sink, if it has a `flush` method."""
+    flush = getattr(out, "flush", None)
+    if flush is not None:
+        flush()
+
+
+@contextlib.contextmanager
+def open_atomically(path, mode="w"):
+    """Opens a temporary file that replaces `path` once the block completes.
+
+    Readers never see a partial file, and `path` is left alone if the block
+    raises. An existing file keeps its permissions, a new one gets the usual
+    permissions for the current umask.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        file_mode = os.stat(path).st_mode & 0o777
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        file_mode = 0o666 & ~umask
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        encoding = None if "b" in mode else "utf-8"
+        with os.fdopen(fd, mode, encoding=encoding) as f:
+            yield f
+        os.chmod(temp_path, file_mode)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def write_atomically(*, path, data):
+    """Writes bytes to `path` via a temporary file, so readers never see a partial file."""
+    with open_atomically(path, "wb") as f:
+        f.write(data)
@@ -1,12 +1,37 @@
 import sys
 import argparse
-from .mermaid_utilities import generate_mermaid
-from .order_of_work import order_of_work
-from .yaml_utilities import parse_yaml, update_yaml
+
+# The command modules pull in heavy dependencies (ruamel, jsonschema and
+# rich), so they are imported only once we know which command is running.
+# That keeps `spt --help` and argument errors fast.
 
 
 def main():
-    parser = argparse.ArgumentParser(description="Simple project tool")
+    # Subcommands are picked out by hand so that the original
+    # `spt [yaml_file]` form keeps working.
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        from .batch_utilities import batch_main
+
+        batch_main(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "complete":
+        from .completion_utilities import complete_main
+
+        complete_main(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "query":
+        from .query_utilities import query_main
+
+        query_main(sys.argv[2:])
+        return
+
+    parser = argparse.ArgumentParser(
+        description="Simple project tool",
+        epilog="Run `spt batch --help` for rendering many project files at once, "
+        "`spt complete --help` for marking stages complete in place and "
+        "`spt query --help` for finding what blocks a stage and what can be "
+        "started now.",
+    )
     parser.add_argument(
         "yaml_file", nargs="?", default="project.yaml", help="YAML project file"
     )
@@ -35,11 +60,312 @@ def main():
         help="Outputs an up to date YAML file. Use with --complete-is-tree to update the complete status of stages.",
     )
 
+    parser.add_argument(
+        "--write",
+        action="store_true",
+        help="With --update-yaml, replace the YAML file with the update instead of printing it",
+    )
+    parser.add_argument(
+        "--prettier",
+        action="store_true",
+        help="With --update-yaml, format the YAML with the external prettier command instead of the built-in formatter",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Reuse the parsed and sorted project from an on-disk cache when the file is unchanged. Not used with --update-yaml.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="Directory for --cache entries (default: $XDG_CACHE_HOME/simple-project-tool)",
+    )
+    parser.add_argument(
+        "-s",
+        "--schedule",
+        action="store_true",
+        help="Output a schedule with the critical path and a plan for --workers people, based on stage estimates",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of people working in parallel for --schedule (default: 1)",
+    )
+    parser.add_argument(
+        "-w",
+        "--watch",
+        action="store_true",
+        help="Keep running and rewrite the Mermaid diagram (<file>.mmd) and order of work (<file>.order.txt) whenever the YAML file changes",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=0.5,
+        help="Seconds between checks for changes with --watch (default: 0.5)",
+    )
+    parser.add_argument(
+        "--focus",
+        metavar="TITLE",
+        help="Only draw the stages around the stage with this title in the Mermaid diagram, summarising the rest",
+    )
+    parser.add_argument(
+        "--depth",
+        type=int,
+        help="How many dependency steps from the --focus stage to draw (default: no limit)",
+    )
+    parser.add_argument(
+        "--upstream",
+        action="store_true",
+        help="With --focus, draw the stages the focus stage depends on",
+    )
+    parser.add_argument(
+        "--downstream",
+        action="store_true",
+        help="With --focus, draw the stages depending on the focus stage (both directions are drawn if neither option is given)",
+    )
+    parser.add_argument(
+        "--reduce-edges",
+        action="store_true",
+        help="Leave out of the Mermaid diagram the edges already implied by other paths (the transitive reduction)",
+    )
+    parser.add_argument(
+        "--stable-ids",
+        action="store_true",
+        help="Derive Mermaid node ids from the stages' titles rather than numbering them, so editing the YAML only changes the lines of the stages edited",
+    )
+    parser.add_argument(
+        "--shard-by",
+        choices=["top-level"],
+        help="Write the Mermaid diagram as one file per top-level stage with sub-stages, plus an index.mmd linking them, into --out-dir",
+    )
+    parser.add_argument(
+        "--out-dir",
+        help="Directory to write the --shard-by diagrams into",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="Number of processes writing --shard-by diagrams (default: one per CPU)",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["json", "ndjson", "csv", "graphml"],
+        help="Output machine readable records instead: the order of work (with -o) as json, ndjson or csv, otherwise the stage graph as json, ndjson or graphml",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="table",
+        choices=["table", "json"],
+        help="Report the time, number of calls and peak memory of each step on stderr, as a table (default) or JSON",
+    )
+    parser.add_argument(
+        "--cprofile",
+        metavar="FILE",
+        help="Write cProfile statistics for the run to FILE, for use with pstats or snakeviz",
+    )
+
     args = parser.parse_args()
 
-    project = parse_yaml(args.yaml_file)
+    focus_options = args.depth is not None or args.upstream or args.downstream
+    if focus_options and args.focus is None:
+        print(
+            "The --depth, --upstream and --downstream options need --focus.",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+    if args.focus is not None and (
+        args.order_of_work or args.update_yaml or args.schedule or args.watch
+    ):
+        print(
+            "The --focus option only applies to the Mermaid diagram.",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+    if args.format is not None:
+        from .export_utilities import ORDER_FORMATS, GRAPH_FORMATS
+
+        if args.update_yaml or args.schedule or args.watch or args.focus:
+            print(
+                "The --format option cannot be combined with --update-yaml, "
+                "--schedule, --watch or --focus.",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+        formats = ORDER_FORMATS if args.order_of_work else GRAPH_FORMATS
+        if args.format not in formats:
+            print(
+                f"The {'order of work' if args.order_of_work else 'stage graph'} "
+                f"can be output as {', '.join(formats)}, not {args.format}.",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+    if args.reduce_edges and (
+        args.order_of_work
+        or args.update_yaml
+        or args.schedule
+        or args.watch
+        or args.focus is not None
+        or args.format is not None
+    ):
+        print(
+            "The --reduce-edges option only applies to the full Mermaid diagram.",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+    if args.stable_ids and (
+        args.order_of_work
+        or args.update_yaml
+        or args.schedule
+        or args.focus is not None
+        or args.format is not None
+    ):
+        print(
+            "The --stable-ids option only applies to the full Mermaid diagram.",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+    if (args.shard_by is None) != (args.out_dir is None):
+        print(
+            "The --shard-by and --out-dir options must be used together.",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+    if args.jobs is not None and args.shard_by is None:
+        print("The --jobs option needs --shard-by.", file=sys.stderr)
+        sys.exit(1)
+    if args.jobs is not None and args.jobs < 1:
+        print("The --jobs option must be at least 1.", file=sys.stderr)
+        sys.exit(1)
+    if args.shard_by is not None and (
+        args.order_of_work
+        or args.update_yaml
+        or args.schedule
+        or args.watch
+        or args.focus is not None
+        or args.format is not None
+    ):
+        print(
+            "The --shard-by option only applies to the full Mermaid diagram.",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+    if (args.write or args.prettier) and not args.update_yaml:
+        print(
+            "The --write and --prettier options need --update-yaml.",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+    if args.depth is not None and args.depth < 0:
+        print("The --depth option cannot be negative.", file=sys.stderr)
+        sys.exit(1)
+
+    if args.watch:
+        if args.update_yaml or args.order_of_work or args.profile or args.cprofile:
+            print(
+                "The --watch option writes both outputs and cannot be combined "
+                "with --update-yaml, --order-of-work, --profile or --cprofile.",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+        from .watch_utilities import ProjectWatcher
+
+        ProjectWatcher(
+            yaml_file=args.yaml_file,
+            complete_is_tree=args.complete_is_tree,
+            incomplete_only=args.incomplete_only,
+            stable_ids=args.stable_ids,
+        ).run(interval=args.interval)
+        return
+
+    from .validation_utilities import ProjectValidationError, print_validation_error
+
+    try:
+        if args.profile is None and args.cprofile is None:
+            run(args)
+        else:
+            from .profile_utilities import run_profiled
 
-    if args.order_of_work:
+            run_profiled(
+                run=lambda: run(args),
+                report_format=args.profile,
+                cprofile_path=args.cprofile,
+            )
+    except ProjectValidationError as e:
+        print_validation_error(e, yaml_file=args.yaml_file)
+        sys.exit(1)
+
+
+def run(args):
+    """Loads the project and produces the output asked for on the command line."""
+    sort_result = None
+    if args.cache and not args.update_yaml:
+        from .cache_utilities import load_sorted_project
+
+        project, sort_result = load_sorted_project(
+            yaml_file=args.yaml_file,
+            complete_is_tree=args.complete_is_tree,
+            cache_dir=args.cache_dir,
+        )
+    else:
+        from .include_utilities import load_project
+
+        # Only --update-yaml writes the document back, so everything else can
+        # use the fast safe loader.
+        project = load_project(args.yaml_file, round_trip=args.update_yaml)
+        if not args.update_yaml:
+            from .sort_utilities import topological_sort
+
+            sort_result = topological_sort(
+                project=project,
+                complete_is_tree=args.complete_is_tree,
+                updating_yaml=False,
+            )
+            # The stages hold everything the outputs need, so only the
+            # project's title is kept and the document can be freed.
+            project = {"title": project["title"]}
+
+    if args.format is not None:
+        from .export_utilities import export_order_of_work, export_graph
+
+        if args.order_of_work:
+            export_order_of_work(
+                project=project,
+                complete_is_tree=args.complete_is_tree,
+                incomplete_only=args.incomplete_only,
+                format=args.format,
+                sort_result=sort_result,
+            )
+        else:
+            export_graph(
+                project=project,
+                complete_is_tree=args.complete_is_tree,
+                format=args.format,
+                sort_result=sort_result,
+            )
+    elif args.schedule:
+        if args.update_yaml or args.order_of_work:
+            print(
+                "The --schedule option cannot be combined with --update-yaml "
+                "or --order-of-work.",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+        if args.workers < 1:
+            print("The --workers option must be at least 1.", file=sys.stderr)
+            sys.exit(1)
+        from .schedule_utilities import schedule_project, print_schedule
+
+        print_schedule(
+            schedule=schedule_project(
+                project=project,
+                workers=args.workers,
+                complete_is_tree=args.complete_is_tree,
+                sort_result=sort_result,
+            )
+        )
+    elif args.order_of_work:
         if args.update_yaml:
             print(
                 "The --update-yaml option is not supported with --order-of-work. "
@@ -47,10 +373,13 @@ def main():
                 file=sys.stderr,
             )
             sys.exit(1)
+        from .order_of_work import order_of_work
+
         order_of_work(
             project=project,
             complete_is_tree=args.complete_is_tree,
             incomplete_only=args.incomplete_only,
+            sort_result=sort_result,
         )
     elif args.update_yaml:
         if args.incomplete_only:
@@ -69,12 +398,74 @@ def main():
                 file=sys.stderr,
             )
             sys.exit(1)
-        update_yaml(project=project, complete_is_tree=args.complete_is_tree)
+        from .yaml_utilities import update_yaml
+
+        if args.write:
+            from .general_utilities import open_atomically
+
+            # The file is only replaced once the update is fully written.
+            with open_atomically(args.yaml_file) as out:
+                update_yaml(
+                    project=project,
+                    complete_is_tree=args.complete_is_tree,
+                    out=out,
+                    prettier=args.prettier,
+                )
+        else:
+            update_yaml(
+                project=project,
+                complete_is_tree=args.complete_is_tree,
+                prettier=args.prettier,
+            )
     else:
         if args.incomplete_only:
             print("The --incomplete-only option is not supported for Mermaid output.")
             sys.exit(1)
-        generate_mermaid(project=project, complete_is_tree=args.complete_is_tree)
+        if args.focus is not None:
+            from .focus_utilities import generate_focused_mermaid
+
+            # Draw both directions unless only one was asked for.
+            both = not (args.upstream or args.downstream)
+            try:
+                generate_focused_mermaid(
+                    project=project,
+                    complete_is_tree=args.complete_is_tree,
+                    title=args.focus,
+                    depth=args.depth,
+                    upstream=args.upstream or both,
+                    downstream=args.downstream or both,
+                    sort_result=sort_result,
+                )
+            except ValueError as e:
+                print(e, file=sys.stderr)
+                sys.exit(1)
+            return
+        if args.shard_by is not None:
+            from .shard_utilities import write_sharded_mermaid
+
+            paths = write_sharded_mermaid(
+                project=project,
+                complete_is_tree=args.complete_is_tree,
+                out_dir=args.out_dir,
+                jobs=args.jobs,
+                sort_result=sort_result,
+                reduce_edges=args.reduce_edges,
+                stable_ids=args.stable_ids,
+            )
+            count = len(paths) - 1
+            print(
+                f"Wrote {count} shard{'s' if count != 1 else ''} and " f"{paths[-1]}."
+            )
+            return
+        from .mermaid_utilities import generate_mermaid
+
+        generate_mermaid(
+            project=project,
+            complete_is_tree=args.complete_is_tree,
+            sort_result=sort_result,
+            reduce_edges=args.reduce_edges,
+            stable_ids=args.stable_ids,
+        )
 
 
 if __name__ == "__main__":
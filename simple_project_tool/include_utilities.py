@@ -0,0 +1,101 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+
+def load_document(yaml_file, cache_dir=None):
+    """Loads and validates one file of a composed project.
+
+    Module level so it can run in a worker process. Uses the per-file cache
+    when `cache_dir` is given.
+    """
+    try:
+        if cache_dir is not None:
+            from .cache_utilities import load_cached_document
+
+            return load_cached_document(yaml_file=yaml_file, cache_dir=cache_dir)
+        from .yaml_utilities import parse_yaml
+
+        return parse_yaml(yaml_file, round_trip=False)
+    except SystemExit:
+        # parse_yaml has reported the problem but not which file it was in.
+        print(f"In file: {yaml_file}", file=sys.stderr)
+        raise
+
+
+def load_documents(paths, *, cache_dir=None):
+    """Loads several files, in parallel worker processes when there is more than one.
+
+    YAML parsing is CPU-bound pure Python for the most part, so threads
+    would not help.
+    """
+    if len(paths) < 2:
+        return [load_document(path, cache_dir) for path in paths]
+    max_workers = min(len(paths), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(load_document, paths, [cache_dir] * len(paths)))
+
+
+def compose_project(yaml_file, *, round_trip=False, cache_dir=None):
+    """Loads a project together with every file it includes.
+
+    A project file may list other project files under `include`, relative
+    to itself. Each included file is validated as a project in its own
+    right and its root becomes one of the including project's
+    `parallel_stages`, so `depends_on` can refer to stages in any file.
+    Included files are loaded a level at a time, each level in parallel.
+
+    Returns `(project, files)`, where `files` lists every file loaded, the
+    main one first.
+    """
+    yaml_file = Path(yaml_file)
+    if cache_dir is not None and not round_trip:
+        project = load_document(yaml_file, cache_dir)
+    else:
+        from .yaml_utilities import parse_yaml
+
+        project = parse_yaml(yaml_file, round_trip=round_trip)
+    files = [yaml_file]
+
+    if "include" in project and round_trip:
+        print(
+            "Projects using include cannot be updated in place; "
+            "update the included files individually.",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+    seen = {yaml_file.resolve()}
+    including = [(project, yaml_file)]
+    while including:
+        to_load = []
+        for document, path in including:
+            for include in document.pop("include", []):
+                include_path = path.parent / include
+                resolved = include_path.resolve()
+                if resolved in seen:
+                    print(
+                        f"'{include}' is included more than once "
+                        f"(last included from {path}).",
+                        file=sys.stderr,
+                    )
+                    sys.exit(1)
+                seen.add(resolved)
+                to_load.append((document, include_path))
+
+        documents = load_documents(
+            [include_path for _, include_path in to_load], cache_dir=cache_dir
+        )
+        including = []
+        for (document, include_path), included in zip(to_load, documents):
+            document.setdefault("parallel_stages", []).append(included)
+            files.append(include_path)
+            including.append((included, include_path))
+    return project, files
+
+
+def load_project(yaml_file, *, round_trip=False, cache_dir=None):
+    """Loads a project and everything it includes, see `compose_project`."""
+    project, _ = compose_project(yaml_file, round_trip=round_trip, cache_dir=cache_dir)
+    return project
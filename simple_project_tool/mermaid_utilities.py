@@ -1,22 +1,33 @@
+import hashlib
+import sys
 from .general_utilities import (
-    is_leaf,
+    write_lines,
     AlphaLabelGenerator,
     NodeRefGenerator,
     INDENT_SPACES,
 )
-from .sort_utilities import topological_sort
+from .profile_utilities import phase
+
+
+def mermaid_leaf_declaration(*, stage, indentation_level=0):
+    """Returns the line declaring a leaf as the node `stage.leaf_ref`."""
+    indent = " " * (INDENT_SPACES * indentation_level)
+    if stage.milestone:
+        return f'{indent}{stage.leaf_ref}{{{{"{stage.title}"}}}}'
+    else:
+        return f'{indent}{stage.leaf_ref}["{stage.title}"]'
 
 
 def generate_mermaid_leaf_declaration(
     *, stage, leaf_ref_generator, indentation_level=0
 ):
-    indent = " " * (INDENT_SPACES * indentation_level)
-    leaf_ref = leaf_ref_generator.next()
-    stage["leaf_ref"] = leaf_ref
-    if stage.get("milestone", False):
-        return f"{indent}{leaf_ref}{{{{\"{stage['title']}\"}}}}"
-    else:
-        return f"{indent}{leaf_ref}[\"{stage['title']}\"]"
+    stage.leaf_ref = leaf_ref_generator.next()
+    return mermaid_leaf_declaration(stage=stage, indentation_level=indentation_level)
+
+
+def node_ref(stage):
+    """Returns the Mermaid node id a stage is drawn as."""
+    return stage.leaf_ref if stage.leaf else stage.sub_graph.head_id
 
 
 class SubGraph:
@@ -34,77 +45,151 @@ class SubGraph:
     def add_sub_graph(self, sub_graph):
         self.sub_graphs.append(sub_graph)
 
-    def generate_mermaid_sub_graphs(self, *, indentation_level=0):
-        single_indent = " " * INDENT_SPACES
-        indent = " " * (INDENT_SPACES * indentation_level)
-        result = f"{indent}subgraph \"{self.stage['title']}\"\n"
-        if self.stage.get("milestone", False):
-            result += f"{indent}{single_indent}{self.head_id}{{{{\"{self.stage['title']}\"}}}}\n"
-        else:
-            result += (
-                f"{indent}{single_indent}{self.head_id}[\"{self.stage['title']}\"]\n"
-            )
-
-        for sub_graph in self.sub_graphs:
-            result += sub_graph.generate_mermaid_sub_graphs(
-                indentation_level=indentation_level + 1
-            )
+    def assign_leaf_refs(self):
+        """Gives this sub graph's own leaves their node ids, in the order they are drawn."""
         for stage in self.sub_stages:
-            result += (
-                generate_mermaid_leaf_declaration(
-                    stage=stage,
-                    leaf_ref_generator=self.leaf_ref_generator,
-                    indentation_level=indentation_level + 1,
-                )
-                + "\n"
-            )
-        result += f"{indent}end\n"
-        return result
+            stage.leaf_ref = self.leaf_ref_generator.next()
+
+    def iter_mermaid_lines(self, *, indentation_level=0):
+        """Yields the lines declaring this sub graph and everything nested in it.
+
+        Nested sub graphs are walked with an explicit stack rather than by
+        recursion, so each line is produced once however deep the nesting is.
+        The leaves must have their node ids already, see `assign_leaf_refs`.
+        """
+        single_indent = " " * INDENT_SPACES
+        # Each entry is (action, sub_graph, indentation_level)
+        pending = [("open", self, indentation_level)]
+        while pending:
+            action, sub_graph, level = pending.pop()
+            indent = " " * (INDENT_SPACES * level)
+            if action == "open":
+                stage = sub_graph.stage
+                yield f'{indent}subgraph "{stage.title}"'
+                if stage.milestone:
+                    yield f'{indent}{single_indent}{sub_graph.head_id}{{{{"{stage.title}"}}}}'
+                else:
+                    yield f'{indent}{single_indent}{sub_graph.head_id}["{stage.title}"]'
+                # Pushed in reverse so nested sub graphs come out first, then
+                # the leaves and finally the closing `end`.
+                pending.append(("close", sub_graph, level))
+                pending.append(("leaves", sub_graph, level + 1))
+                for inner_sub_graph in reversed(sub_graph.sub_graphs):
+                    pending.append(("open", inner_sub_graph, level + 1))
+            elif action == "leaves":
+                for stage in sub_graph.sub_stages:
+                    yield mermaid_leaf_declaration(stage=stage, indentation_level=level)
+            else:
+                yield f"{indent}end"
 
     def __str__(self):
         return f"SubGraph(title={self.stage}, stages={self.sub_stages})"
 
 
-def generate_mermaid(*, project, complete_is_tree):
+def iter_mermaid(*, project, sort_result, reduce_edges=False, stable_ids=False):
+    """Yields the lines of the project's Mermaid diagram, without line endings.
 
-    # TODO: This could be replaced by validation as the resulting order of work
-    # is only relied upon for obtaining the project stage, which could be
-    # easily obtained differently. If we do get rid of it, copy out the
-    # complete_is_tree logic.
-    G, by_title, stages = topological_sort(
-        project=project, complete_is_tree=complete_is_tree, updating_yaml=False
+    `sort_result` is the project's `topological_sort` result, whose graph
+    has passed `validate_graph` and whose stages carry everything drawn,
+    including inherited completion. With `reduce_edges` set, edges implied
+    by other paths are left out, see
+    `StageGraph.transitive_reduction`. With `stable_ids` set, node ids are
+    derived from the stages' title paths, see `layout_mermaid`.
+    """
+    yield from iter_mermaid_structure(
+        project=project,
+        sort_result=sort_result,
+        reduce_edges=reduce_edges,
+        stable_ids=stable_ids,
     )
+    yield from iter_mermaid_styles(stages=sort_result[2])
+
+
+class MermaidLayout:
+    """How the full diagram is laid out, with every stage's node id assigned.
+
+    `top_level_leaves` and `top_level_sub_graphs` are drawn directly in the
+    project. `flat_sub_graphs` and `flat_leaves` hold every sub graph
+    (including the project's own, which is never drawn) and every leaf in
+    sort order.
+    """
+
+    def __init__(
+        self,
+        *,
+        project_id,
+        top_level_leaves,
+        top_level_sub_graphs,
+        flat_sub_graphs,
+        flat_leaves,
+    ):
+        self.project_id = project_id
+        self.top_level_leaves = top_level_leaves
+        self.top_level_sub_graphs = top_level_sub_graphs
+        self.flat_sub_graphs = flat_sub_graphs
+        self.flat_leaves = flat_leaves
+
+    def edge_sources(self):
+        """Returns the stages in the order their edges are drawn, sub graphs first and then leaves."""
+        return [
+            sub_graph.stage for sub_graph in self.flat_sub_graphs
+        ] + self.flat_leaves
+
+
+def stable_node_ids(*, stages, project_id):
+    """Returns a hex digest for each stage, by node id, derived from its title path.
+
+    Each digest is a 64 bit hash of the stage's title keyed by its parent's
+    digest, so it only changes when the stage, or a stage it is nested in,
+    is renamed or moved. The project's title is left out, so renaming the
+    project changes none of them.
+    """
+    digests = {}
+    for stage in reversed(stages):
+        # A stage's parent always comes after it in the sort order.
+        if stage.parent == project_id or stage.parent == -1:
+            parent_key = b""
+        else:
+            parent_key = digests[stage.parent]
+        digests[stage.node_id] = hashlib.blake2b(
+            stage.title.encode(), digest_size=8, key=parent_key
+        ).digest()
+    return {node_id: digest.hex() for node_id, digest in digests.items()}
+
+
+def layout_mermaid(*, project, sort_result, stable_ids=False):
+    """Builds the diagram's sub graphs and gives every stage its node id, see `node_ref`.
+
+    Node ids are numbered in sort order, so adding a stage renumbers most of
+    the diagram. With `stable_ids` set they are derived from the stages'
+    title paths instead (see `stable_node_ids`), as `S<digest>` for leaves
+    and `G<digest>_head` for sub graphs, so an edit only changes the lines
+    of the stages it touches.
+    """
+    G, by_title, stages = sort_result
+    project_id = G.ids[project["title"]]
 
     alpha_label_generator = AlphaLabelGenerator()
     group_id_generator = NodeRefGenerator(prefix="Group_")
-    print("flowchart BT")
-    project_title = project["title"]
-    #  A
-    print(f'Project(["{project["title"]}"])')
-    print("")
-    print("style Project fill:#AC36BC,stroke:#333,stroke-width:2px,color:#fff")
-    print("")
     flat_sub_graphs = []
     flat_leaves = []
-    sub_graph = None
     project_leaf_ref_generator = None
 
     # Stage parents may not have been created yet so we need to delay
-    # both sub graphs and leaves until we have all the sub graphs
-    # created.
-
-    # An alternative would be to walk the project tree. This is good enough
-    # for now, but may not be the best solution in the future.
+    # attaching sub graphs and leaves until we have all the sub graphs
+    # created. Sub graphs are indexed by node id, so a child finds its
+    # parent's sub graph from its `parent` id.
+    sub_graphs = {}
     for stage in stages:
         # YAML validation ensures every stage has a parent
-        if is_leaf(stage):
+        if stage.leaf:
             # Generate leaf ref here as patching it elsewhere
             # did not work with certain structures.
             if project_leaf_ref_generator is None:
                 project_leaf_ref_generator = NodeRefGenerator(
                     prefix=alpha_label_generator.next()
                 )
-            stage["leaf_ref"] = project_leaf_ref_generator.next()
+            stage.leaf_ref = project_leaf_ref_generator.next()
             flat_leaves.append(stage)
         else:
             # Sub graph
@@ -114,77 +199,131 @@ def generate_mermaid(*, project, complete_is_tree):
                 group_id=group_id_generator.next(),
             )
 
-            stage["sub_graph"] = sub_graph
+            stage.sub_graph = sub_graph
+            sub_graphs[stage.node_id] = sub_graph
 
             flat_sub_graphs.append(sub_graph)
 
+    top_level_sub_graphs = []
     for sub_graph in flat_sub_graphs:
-        for inner_sub_graph in flat_sub_graphs:
-            if (
-                "parent" in inner_sub_graph.stage
-                and inner_sub_graph.stage["parent"]
-                and sub_graph.stage["title"] == inner_sub_graph.stage["parent"]["title"]
-            ):
-                sub_graph.add_sub_graph(inner_sub_graph)
+        parent = sub_graph.stage.parent
+        if parent == project_id:
+            top_level_sub_graphs.append(sub_graph)
+        elif parent != -1:
+            sub_graphs[parent].add_sub_graph(sub_graph)
 
+    top_level_leaves = []
     for leaf in flat_leaves:
-        if leaf["parent"]["title"] == project_title:
-            print(
-                generate_mermaid_leaf_declaration(
-                    stage=leaf, leaf_ref_generator=project_leaf_ref_generator
-                )
-            )
+        if leaf.parent == project_id:
+            # Declared in the project, with the next of its leaf refs.
+            leaf.leaf_ref = project_leaf_ref_generator.next()
+            top_level_leaves.append(leaf)
         else:
-            for sub_graph in flat_sub_graphs:
-                if sub_graph.stage["title"] == leaf["parent"]["title"]:
-                    sub_graph.add_stage(leaf)
-                    break
-
-    for sub_graph in flat_sub_graphs:
-        if (
-            "parent" in sub_graph.stage
-            and sub_graph.stage["parent"]
-            and sub_graph.stage["parent"]["title"] == project_title
-        ):
-            print(sub_graph.generate_mermaid_sub_graphs())
-
-    # Output the edges
+            sub_graphs[leaf.parent].add_stage(leaf)
     for sub_graph in flat_sub_graphs:
-        for from_node, to_node in G.out_edges(sub_graph.stage["title"]):
-            to_stage_node = by_title[to_node]
-            from_node_ref = sub_graph.head_id
-            if to_stage_node["title"] == project["title"]:
-                print(f"{from_node_ref} --> Project")
-            elif is_leaf(to_stage_node):
-                print(f'{from_node_ref} --> {to_stage_node["leaf_ref"]}')
-            else:
-                print(f'{from_node_ref} --> {to_stage_node["sub_graph"].head_id}')
+        sub_graph.assign_leaf_refs()
+    if stable_ids:
+        digests = stable_node_ids(stages=stages, project_id=project_id)
+        for leaf in flat_leaves:
+            leaf.leaf_ref = f"S{digests[leaf.node_id]}"
+        for sub_graph in flat_sub_graphs:
+            sub_graph.group_id = f"G{digests[sub_graph.stage.node_id]}"
+            sub_graph.head_id = f"{sub_graph.group_id}_head"
 
-    # Output the edges
-    for leaf in flat_leaves:
-        from_leaf_ref = leaf["leaf_ref"]
-        for from_node, to_node in G.out_edges(leaf["title"]):
-            to_stage_node = by_title[to_node]
-            if to_stage_node["title"] == project["title"]:
-                print(f"{from_leaf_ref} --> Project")
-            elif is_leaf(to_stage_node):
-                print(f'{from_leaf_ref} --> {to_stage_node["leaf_ref"]}')
+    return MermaidLayout(
+        project_id=project_id,
+        top_level_leaves=top_level_leaves,
+        top_level_sub_graphs=top_level_sub_graphs,
+        flat_sub_graphs=flat_sub_graphs,
+        flat_leaves=flat_leaves,
+    )
+
+
+def iter_mermaid_structure(
+    *, project, sort_result, reduce_edges=False, stable_ids=False
+):
+    """Yields the node declarations, sub graphs and edges of the diagram.
+
+    Every stage is given its Mermaid node id along the way, see `node_ref`
+    and `layout_mermaid`.
+    """
+    G, by_title, _ = sort_result
+    layout = layout_mermaid(
+        project=project, sort_result=sort_result, stable_ids=stable_ids
+    )
+    project_id = layout.project_id
+
+    yield "flowchart BT"
+    #  A
+    yield f'Project(["{project["title"]}"])'
+    yield ""
+    yield "style Project fill:#AC36BC,stroke:#333,stroke-width:2px,color:#fff"
+    yield ""
+
+    for leaf in layout.top_level_leaves:
+        yield mermaid_leaf_declaration(stage=leaf)
+
+    for sub_graph in layout.top_level_sub_graphs:
+        yield from sub_graph.iter_mermaid_lines()
+        yield ""
+
+    successors = G.transitive_reduction() if reduce_edges else G.successors
+    # Output the edges, sub graphs first and then leaves
+    for stage in layout.edge_sources():
+        from_node_ref = node_ref(stage)
+        for to_id in successors[stage.node_id]:
+            if to_id == project_id:
+                yield f"{from_node_ref} --> Project"
             else:
-                print(f'{from_leaf_ref} --> {to_stage_node["sub_graph"].head_id}')
+                to_stage = by_title[G.titles[to_id]]
+                yield f"{from_node_ref} --> {node_ref(to_stage)}"
 
-    print("")
+    yield ""
 
+
+def iter_mermaid_styles(*, stages, node_ref_of=node_ref):
+    """Yields the style lines colouring complete stages.
+
+    `node_ref_of` maps a stage to its node id, which by default is the one
+    `iter_mermaid_structure` assigned.
+    """
     # Show complete stages in green
     for stage in stages:
-        if stage.get("complete", False):
-            node_id = (
-                stage["leaf_ref"] if is_leaf(stage) else stage["sub_graph"].head_id
-            )
-            if stage.get("milestone", False):
-                print(
-                    f"style {node_id} fill:#7444EE,stroke:#333,stroke-width:2px,color:#fff"
-                )
+        if stage.complete:
+            node_id = node_ref_of(stage)
+            if stage.milestone:
+                yield f"style {node_id} fill:#7444EE,stroke:#333,stroke-width:2px,color:#fff"
             else:
-                print(
-                    f"style {node_id} fill:{"#047D08" if is_leaf(stage) else "#327E96"},stroke:#333,stroke-width:2px,color:#fff"
-                )
+                fill = "#047D08" if stage.leaf else "#327E96"
+                yield f"style {node_id} fill:{fill},stroke:#333,stroke-width:2px,color:#fff"
+
+
+def generate_mermaid(
+    *,
+    project,
+    complete_is_tree,
+    out=None,
+    sort_result=None,
+    reduce_edges=False,
+    stable_ids=False,
+):
+    """Writes the project's Mermaid diagram to `out` (stdout by default).
+
+    `out` can be any text sink with a `write` method, such as an open file,
+    an `io.StringIO` or a socket wrapped with `makefile("w")`.
+    """
+    from .sort_utilities import sorted_project
+
+    sort_result = sorted_project(
+        project=project, complete_is_tree=complete_is_tree, sort_result=sort_result
+    )
+    with phase("mermaid"):
+        write_lines(
+            out=sys.stdout if out is None else out,
+            lines=iter_mermaid(
+                project=project,
+                sort_result=sort_result,
+                reduce_edges=reduce_edges,
+                stable_ids=stable_ids,
+            ),
+        )
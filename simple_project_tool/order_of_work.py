@@ -1,56 +1,81 @@
-from rich.console import Console
-from .sort_utilities import topological_sort
-from .general_utilities import is_leaf
+from .profile_utilities import phase
 
+# Console style for each (kind, milestone) pair
+ENTRY_STYLES = {
+    ("leaf", False): "cyan",
+    ("leaf", True): "bright_cyan",
+    ("group", False): "green",
+    ("group", True): "bright_green",
+    ("project", False): "bright_magenta",
+    ("project", True): "bright_magenta",
+}
 
-def order_of_work(*, project, complete_is_tree, incomplete_only):
-    console = Console()
-    G, by_title, stages = topological_sort(
-        project=project, complete_is_tree=complete_is_tree, updating_yaml=False
-    )
-    console.print("# Suggested order of work", style="bright_magenta")
-    console.print("")
+
+def iter_order_of_work(*, stages, incomplete_only):
+    """Yields `(position, stage, kind)` for each stage in the suggested order of work.
+
+    `kind` is "leaf", "group" or "project". The project always comes last.
+    """
     counter = 0
     for stage in stages[:-1]:  # Exclude the project stage itself
-        if incomplete_only and stage.get("complete", False):
+        if incomplete_only and stage.complete:
             continue
         counter += 1
-        # TODO: We could use suffix and colour to remove the need for 4 print statements
-        suffix = ""
-        if stage.get("complete", False):
-            suffix = " ✅"
-        if is_leaf(stage):
-            if stage.get("milestone", False):
-                console.print(
-                    f'[bright_cyan]{counter}.[/bright_cyan] {stage["title"]} (milestone){suffix}',
-                    style="bright_cyan",
-                    highlight=False,
-                )
-            else:
-                console.print(
-                    f'[bright_cyan]{counter}.[/bright_cyan] {stage["title"]}{suffix}',
-                    style="cyan",
-                    highlight=False,
-                )
-        else:
-            if stage.get("milestone", False):
-                console.print(
-                    f'[bright_cyan]{counter}.[/bright_cyan] {stage["title"]} (group) (milestone){suffix}',
-                    style="bright_green",
-                    highlight=False,
-                )
-            else:
-                console.print(
-                    f'[bright_cyan]{counter}.[/bright_cyan] {stage["title"]} (group){suffix}',
-                    style="green",
-                    highlight=False,
-                )
+        yield counter, stage, "leaf" if stage.leaf else "group"
     # Project stage
-    if not (incomplete_only and project.get("complete", False)):
+    project = stages[-1]
+    if not (incomplete_only and project.complete):
         counter += 1
-        console.print(
-            f'[bright_cyan]{counter}.[/bright_cyan] {project["title"]} (project)',
-            style="bright_magenta",
-            highlight=False,
-        )
-    console.print(f"\nTotal stages: {counter}", style="bright_yellow")
+        yield counter, project, "project"
+
+
+def describe_entry(*, stage, kind):
+    """Returns the stage title with its (group), (milestone) and completion annotations."""
+    if kind == "project":
+        return f"{stage.title} (project)"
+    description = stage.title
+    if kind == "group":
+        description += " (group)"
+    if stage.milestone:
+        description += " (milestone)"
+    if stage.complete:
+        description += " ✅"
+    return description
+
+
+def iter_order_of_work_lines(*, stages, incomplete_only):
+    """Yields the order of work as plain text lines, as written to files."""
+    yield "# Suggested order of work"
+    yield ""
+    counter = 0
+    for counter, stage, kind in iter_order_of_work(
+        stages=stages, incomplete_only=incomplete_only
+    ):
+        yield f"{counter}. {describe_entry(stage=stage, kind=kind)}"
+    yield ""
+    yield f"Total stages: {counter}"
+
+
+def order_of_work(*, project, complete_is_tree, incomplete_only, sort_result=None):
+    from rich.console import Console
+
+    console = Console()
+    from .sort_utilities import sorted_project
+
+    sort_result = sorted_project(
+        project=project, complete_is_tree=complete_is_tree, sort_result=sort_result
+    )
+    G, by_title, stages = sort_result
+    with phase("order_of_work"):
+        console.print("# Suggested order of work", style="bright_magenta")
+        console.print("")
+        counter = 0
+        for counter, stage, kind in iter_order_of_work(
+            stages=stages, incomplete_only=incomplete_only
+        ):
+            console.print(
+                f"[bright_cyan]{counter}.[/bright_cyan] {describe_entry(stage=stage, kind=kind)}",
+                style=ENTRY_STYLES[(kind, stage.milestone)],
+                highlight=False,
+            )
+        console.print(f"\nTotal stages: {counter}", style="bright_yellow")
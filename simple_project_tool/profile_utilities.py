@@ -0,0 +1,173 @@
+import contextlib
+import json
+import sys
+import time
+
+# Context manager factories called with each phase's name, see `add_phase_hook`
+_phase_hooks = []
+
+
+def add_phase_hook(hook):
+    """Registers `hook` to wrap every pipeline phase.
+
+    `hook(name)` must return a context manager, which is entered when the
+    phase starts and exited when it ends, for example to open a tracing
+    span. The phases are "parse", "validate", "sort_stage", "validate_graph",
+    "walk_the_tree", "topological_sort" and the emitters ("mermaid", "order_of_work",
+    "export", "schedule" and "update_yaml"). Phases run in worker processes,
+    such as included files being parsed in parallel, are not seen.
+    """
+    _phase_hooks.append(hook)
+
+
+def remove_phase_hook(hook):
+    _phase_hooks.remove(hook)
+
+
+@contextlib.contextmanager
+def phase(name):
+    """Marks a block of work as the pipeline phase `name` for any registered hooks."""
+    if not _phase_hooks:
+        yield
+        return
+    with contextlib.ExitStack() as stack:
+        for hook in list(_phase_hooks):
+            stack.enter_context(hook(name))
+        yield
+
+
+class PhaseStats:
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.peak_bytes = 0
+
+
+class PhaseProfiler:
+    """A phase hook recording wall time, call counts and peak memory per phase.
+
+    Time spent in a phase includes any phases nested inside it. Memory is
+    only measured when `trace_memory` is set, as tracing allocations slows
+    everything down considerably; the peak is the most memory allocated at
+    once while the phase ran, measured from when it started.
+    """
+
+    def __init__(self, *, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.stats = {}
+        # Peak memory of each open phase seen so far, innermost last
+        self._open_peaks = []
+        # Highest peak seen before tracemalloc's peak was last reset
+        self._run_peak = 0
+
+    def __enter__(self):
+        if self.trace_memory:
+            import tracemalloc
+
+            tracemalloc.start()
+        self.start = time.perf_counter()
+        add_phase_hook(self.hook)
+        return self
+
+    def __exit__(self, *exc_info):
+        remove_phase_hook(self.hook)
+        self.total_seconds = time.perf_counter() - self.start
+        if self.trace_memory:
+            import tracemalloc
+
+            self.total_peak_bytes = max(
+                self._run_peak, tracemalloc.get_traced_memory()[1]
+            )
+            tracemalloc.stop()
+        return False
+
+    @contextlib.contextmanager
+    def hook(self, name):
+        stats = self.stats.setdefault(name, PhaseStats())
+        stats.calls += 1
+        if self.trace_memory:
+            import tracemalloc
+
+            base, peak = tracemalloc.get_traced_memory()
+            self._run_peak = max(self._run_peak, peak)
+            if self._open_peaks:
+                # Resetting the peak below loses it for the enclosing phase.
+                self._open_peaks[-1] = max(self._open_peaks[-1], peak)
+            tracemalloc.reset_peak()
+            self._open_peaks.append(0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stats.seconds += time.perf_counter() - start
+            if self.trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                self._run_peak = max(self._run_peak, peak)
+                peak = max(peak, self._open_peaks.pop())
+                stats.peak_bytes = max(stats.peak_bytes, peak - base)
+                if self._open_peaks:
+                    self._open_peaks[-1] = max(self._open_peaks[-1], peak)
+
+    def as_dict(self):
+        """Returns the measurements as plain data, ready for `json.dumps`."""
+        return {
+            "total_seconds": self.total_seconds,
+            "total_peak_bytes": self.total_peak_bytes if self.trace_memory else None,
+            "phases": {
+                name: {
+                    "calls": stats.calls,
+                    "seconds": stats.seconds,
+                    "peak_bytes": stats.peak_bytes if self.trace_memory else None,
+                }
+                for name, stats in self.stats.items()
+            },
+        }
+
+    def iter_table_lines(self):
+        """Yields the measurements as a plain text table, phases in the order first seen."""
+        yield f"{'Phase':<18} {'Calls':>7} {'Seconds':>10} {'Peak MiB':>10}"
+        for name, stats in self.stats.items():
+            memory = (
+                f"{stats.peak_bytes / 2**20:10.1f}"
+                if self.trace_memory
+                else f"{'-':>10}"
+            )
+            yield f"{name:<18} {stats.calls:>7} {stats.seconds:>10.3f} {memory}"
+        memory = (
+            f"{self.total_peak_bytes / 2**20:10.1f}"
+            if self.trace_memory
+            else f"{'-':>10}"
+        )
+        yield f"{'total':<18} {'':>7} {self.total_seconds:>10.3f} {memory}"
+
+
+def run_profiled(*, run, report_format=None, cprofile_path=None):
+    """Calls `run()`, then reports each phase on stderr and/or writes cProfile stats.
+
+    `report_format` is "table", "json" or None for no report. Memory is only
+    traced when a report is wanted, so cProfile timings are not skewed by it.
+    """
+    profiler = None
+    if cprofile_path is not None:
+        import cProfile
+
+        profiler = cProfile.Profile()
+    phases = PhaseProfiler(trace_memory=report_format is not None)
+    try:
+        with phases:
+            if profiler is not None:
+                profiler.enable()
+            try:
+                run()
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+    finally:
+        # Flush the output first so the report does not end up in the middle.
+        sys.stdout.flush()
+        if profiler is not None:
+            profiler.dump_stats(cprofile_path)
+        if report_format == "json":
+            print(json.dumps(phases.as_dict(), indent=2), file=sys.stderr)
+        elif report_format is not None:
+            print("\n".join(phases.iter_table_lines()), file=sys.stderr)
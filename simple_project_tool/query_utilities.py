@@ -0,0 +1,222 @@
+import argparse
+import sys
+from array import array
+
+QUESTIONS = ("blockers", "unblocks", "ready")
+
+
+class QueryIndex:
+    """What the queries need from a sorted project, worked out once.
+
+    `rank` holds each node's position in the order of work, which is a
+    topological order, so answers can be listed in that order without
+    going over every stage. `ready` lists the node ids of the stages that
+    can be started now, in the order of work. Building takes one pass over
+    the stages and edges; after that each query only visits the stages it
+    is about. It holds no references into the sort result, so it can be
+    cached alongside it.
+    """
+
+    def __init__(self, *, sort_result):
+        G, _, stages = sort_result
+        self.rank = array("l", [0]) * len(G.titles)
+        for position, stage in enumerate(stages):
+            self.rank[stage.node_id] = position
+        complete = bytearray(len(G.titles))
+        for stage in stages:
+            complete[stage.node_id] = stage.complete
+        self.ready = array(
+            "l",
+            (
+                stage.node_id
+                for stage in stages
+                if not stage.complete
+                and all(complete[from_id] for from_id in G.predecessors[stage.node_id])
+            ),
+        )
+
+    def in_order_of_work(self, node_ids):
+        return sorted(node_ids, key=self.rank.__getitem__)
+
+
+def stage_titled(*, by_title, title):
+    if title not in by_title:
+        raise ValueError(f"There is no stage titled '{title}'.")
+    return by_title[title]
+
+
+def stage_of_id(*, G, by_title, node_id):
+    return by_title[G.titles[node_id]]
+
+
+def upstream_ids(*, G, node_id):
+    """Returns the ids of every stage `node_id` depends on, directly or not."""
+    found = set()
+    pending = [node_id]
+    while pending:
+        for from_id in G.predecessors[pending.pop()]:
+            if from_id not in found:
+                found.add(from_id)
+                pending.append(from_id)
+    return found
+
+
+def blockers(*, sort_result, title, index=None):
+    """Returns the stages `title` is still waiting on, directly or not, in the order of work."""
+    G, by_title, _ = sort_result
+    if index is None:
+        index = QueryIndex(sort_result=sort_result)
+    stage = stage_titled(by_title=by_title, title=title)
+    found = []
+    for node_id in index.in_order_of_work(upstream_ids(G=G, node_id=stage.node_id)):
+        from_stage = stage_of_id(G=G, by_title=by_title, node_id=node_id)
+        if not from_stage.complete:
+            found.append(from_stage)
+    return found
+
+
+def unblocks(*, sort_result, title, index=None):
+    """Returns the stages that can be started once `title` is complete.
+
+    These are the stages depending on it whose only unfinished dependency it
+    is. Nothing is unblocked by a stage that is already complete.
+    """
+    G, by_title, _ = sort_result
+    if index is None:
+        index = QueryIndex(sort_result=sort_result)
+    stage = stage_titled(by_title=by_title, title=title)
+    if stage.complete:
+        return []
+    found = []
+    for to_id in index.in_order_of_work(G.successors[stage.node_id]):
+        to_stage = stage_of_id(G=G, by_title=by_title, node_id=to_id)
+        if not to_stage.complete and all(
+            from_id == stage.node_id
+            or stage_of_id(G=G, by_title=by_title, node_id=from_id).complete
+            for from_id in G.predecessors[to_id]
+        ):
+            found.append(to_stage)
+    return found
+
+
+def ready(*, sort_result, title=None, index=None):
+    """Returns the stages that can be started now, in the order of work.
+
+    With `title`, only those `title` depends on, directly or not.
+    """
+    G, by_title, _ = sort_result
+    if index is None:
+        index = QueryIndex(sort_result=sort_result)
+    node_ids = index.ready
+    if title is not None:
+        upstream = upstream_ids(
+            G=G, node_id=stage_titled(by_title=by_title, title=title).node_id
+        )
+        node_ids = [node_id for node_id in node_ids if node_id in upstream]
+    return [
+        stage_of_id(G=G, by_title=by_title, node_id=node_id) for node_id in node_ids
+    ]
+
+
+def print_stages(*, heading, stages, index):
+    from .export_utilities import stage_kind
+    from .order_of_work import describe_entry
+
+    ready_ids = set(index.ready)
+    print(heading)
+    for position, stage in enumerate(stages, start=1):
+        line = f"{position}. {describe_entry(stage=stage, kind=stage_kind(stage))}"
+        if stage.node_id in ready_ids:
+            line += " (ready)"
+        print(line)
+
+
+def plural(count, noun):
+    return f"{count} {noun}{'s' if count != 1 else ''}"
+
+
+def query_main(argv):
+    parser = argparse.ArgumentParser(
+        prog="spt query",
+        description="Answer questions about what is blocking what: the stages a stage is waiting on (blockers), the stages finishing it lets start (unblocks) and the stages that can be started now (ready)",
+    )
+    parser.add_argument("question", choices=QUESTIONS)
+    parser.add_argument(
+        "title",
+        nargs="?",
+        help="Title of the stage to ask about (optional for ready, which then covers the whole project)",
+    )
+    parser.add_argument(
+        "-f",
+        "--file",
+        default="project.yaml",
+        help="YAML project file (default: project.yaml)",
+    )
+    parser.add_argument(
+        "-c",
+        "--complete-is-tree",
+        action="store_true",
+        help="Treat all stages required for a stage as completed if a stage is",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Reuse the parsed and sorted project and its query index from the on-disk cache",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="Directory for --cache entries (default: $XDG_CACHE_HOME/simple-project-tool)",
+    )
+    args = parser.parse_args(argv)
+    if args.title is None and args.question != "ready":
+        print(f"The {args.question} question needs a stage title.", file=sys.stderr)
+        sys.exit(1)
+
+    from .validation_utilities import ProjectValidationError, print_validation_error
+
+    try:
+        if args.cache:
+            from .cache_utilities import load_sorted_project
+
+            _, sort_result, index = load_sorted_project(
+                yaml_file=args.file,
+                complete_is_tree=args.complete_is_tree,
+                cache_dir=args.cache_dir,
+                with_index=True,
+            )
+        else:
+            from .include_utilities import load_project
+            from .sort_utilities import topological_sort
+
+            sort_result = topological_sort(
+                project=load_project(args.file, round_trip=False),
+                complete_is_tree=args.complete_is_tree,
+                updating_yaml=False,
+            )
+            index = QueryIndex(sort_result=sort_result)
+
+        title = args.title
+        if args.question == "blockers":
+            found = blockers(sort_result=sort_result, title=title, index=index)
+            heading = f"'{title}' is waiting on {plural(len(found), 'stage')}:"
+            nothing = f"Nothing is blocking '{title}'."
+        elif args.question == "unblocks":
+            found = unblocks(sort_result=sort_result, title=title, index=index)
+            heading = f"Completing '{title}' lets {plural(len(found), 'stage')} start:"
+            nothing = f"Completing '{title}' does not let any other stage start."
+        else:
+            found = ready(sort_result=sort_result, title=title, index=index)
+            heading = f"{plural(len(found), 'stage')} can be started now"
+            heading += f" towards '{title}':" if title is not None else ":"
+            nothing = "No stage can be started now."
+    except ProjectValidationError as e:
+        print_validation_error(e, yaml_file=args.file)
+        sys.exit(1)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+
+    if not found:
+        print(nothing)
+        return
+    print_stages(heading=heading, stages=found, index=index)
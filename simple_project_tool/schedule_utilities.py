@@ -0,0 +1,252 @@
+import heapq
+from array import array
+
+from .profile_utilities import phase
+
+
+def stage_duration(stage):
+    """Returns the work left on a stage.
+
+    Complete stages take no time. Otherwise a stage takes its `estimate`,
+    defaulting to 1 for leaves and 0 for groups, which just gather up their
+    sub-stages.
+    """
+    if stage is None or stage.complete:
+        return 0.0
+    if stage.estimate is not None:
+        return float(stage.estimate)
+    return 1.0 if stage.leaf else 0.0
+
+
+class Schedule:
+    """Timings for every stage of a project, indexed by the graph's node ids.
+
+    `earliest_start`, `latest_start`, `start` and `finish` are arrays of
+    times. `start` and `finish` come from the worker plan, and `worker` holds
+    the worker each stage was given (-1 for stages that take no time).
+    `critical_path` lists the titles of one longest chain of work, in order.
+    """
+
+    def __init__(self, *, G, durations, workers):
+        self.G = G
+        self.durations = durations
+        self.workers = workers
+        self.earliest_start = None
+        self.latest_start = None
+        self.critical_path = None
+        self.critical_finish = 0.0
+        self.start = None
+        self.finish = None
+        self.worker = None
+        self.makespan = 0.0
+
+    def slack(self, node_id):
+        return self.latest_start[node_id] - self.earliest_start[node_id]
+
+    def timings(self, title):
+        """Returns a dict of the timings worked out for one stage."""
+        node_id = self.G.ids[title]
+        return {
+            "duration": self.durations[node_id],
+            "earliest_start": self.earliest_start[node_id],
+            "latest_start": self.latest_start[node_id],
+            "slack": self.slack(node_id),
+            "start": self.start[node_id],
+            "finish": self.finish[node_id],
+            "worker": self.worker[node_id] + 1 if self.worker[node_id] >= 0 else None,
+        }
+
+
+def compute_critical_path(*, schedule, order):
+    """Fills in earliest/latest starts and the critical path, in linear time.
+
+    `order` is any topological order of node ids.
+    """
+    G = schedule.G
+    durations = schedule.durations
+    node_count = len(G)
+    earliest_start = array("d", bytes(8 * node_count))
+    for node_id in order:
+        finish = earliest_start[node_id] + durations[node_id]
+        for child_id in G.successors[node_id]:
+            if earliest_start[child_id] < finish:
+                earliest_start[child_id] = finish
+    makespan = max(
+        (earliest_start[i] + durations[i] for i in range(node_count)), default=0.0
+    )
+
+    latest_start = array("d", [makespan]) * node_count
+    for node_id in reversed(order):
+        latest_finish = makespan
+        for child_id in G.successors[node_id]:
+            if latest_start[child_id] < latest_finish:
+                latest_finish = latest_start[child_id]
+        latest_start[node_id] = latest_finish - durations[node_id]
+
+    # Walk back from a stage finishing last through predecessors that
+    # finish exactly when it can start.
+    critical_path = []
+    node_id = next(
+        (i for i in order if earliest_start[i] + durations[i] == makespan), None
+    )
+    while node_id is not None:
+        critical_path.append(G.titles[node_id])
+        start = earliest_start[node_id]
+        node_id = next(
+            (
+                from_id
+                for from_id in G.predecessors[node_id]
+                if earliest_start[from_id] + durations[from_id] == start
+            ),
+            None,
+        )
+    critical_path.reverse()
+
+    schedule.earliest_start = earliest_start
+    schedule.latest_start = latest_start
+    schedule.critical_path = critical_path
+    schedule.critical_finish = makespan
+
+
+def compute_worker_plan(*, schedule, order, positions):
+    """Fills in a list schedule for `schedule.workers` workers.
+
+    Whenever a worker is free it takes the ready stage with the most work
+    still chained after it, breaking ties by the suggested order of work
+    (`positions`). Stages that take no time finish as soon as they are
+    ready without using a worker.
+    """
+    G = schedule.G
+    durations = schedule.durations
+    node_count = len(G)
+
+    # Longest chain of work from each stage to the end, including itself.
+    remaining = array("d", bytes(8 * node_count))
+    for node_id in reversed(order):
+        longest_after = 0.0
+        for child_id in G.successors[node_id]:
+            if remaining[child_id] > longest_after:
+                longest_after = remaining[child_id]
+        remaining[node_id] = durations[node_id] + longest_after
+
+    start = array("d", bytes(8 * node_count))
+    finish = array("d", bytes(8 * node_count))
+    worker = array("l", [-1]) * node_count
+    waiting_on = array("l", (len(p) for p in G.predecessors))
+    ready = [
+        (-remaining[i], positions[i], i) for i in range(node_count) if not waiting_on[i]
+    ]
+    heapq.heapify(ready)
+    running = []
+    free_workers = list(range(schedule.workers))
+    now = 0.0
+
+    def release(node_id):
+        for child_id in G.successors[node_id]:
+            waiting_on[child_id] -= 1
+            if not waiting_on[child_id]:
+                heapq.heappush(
+                    ready, (-remaining[child_id], positions[child_id], child_id)
+                )
+
+    while ready or running:
+        while ready and (free_workers or durations[ready[0][2]] == 0):
+            _, _, node_id = heapq.heappop(ready)
+            start[node_id] = now
+            if durations[node_id] == 0:
+                finish[node_id] = now
+                release(node_id)
+                continue
+            worker[node_id] = heapq.heappop(free_workers)
+            finish[node_id] = now + durations[node_id]
+            heapq.heappush(running, (finish[node_id], node_id))
+        if not running:
+            break
+        # Move on to the next time a worker finishes.
+        now = running[0][0]
+        while running and running[0][0] == now:
+            _, node_id = heapq.heappop(running)
+            heapq.heappush(free_workers, worker[node_id])
+            release(node_id)
+
+    schedule.start = start
+    schedule.finish = finish
+    schedule.worker = worker
+    schedule.makespan = max(finish, default=0.0)
+
+
+def schedule_project(*, project, workers, complete_is_tree=False, sort_result=None):
+    """Works out the critical path and a plan for `workers` workers.
+
+    Reuses the graph and suggested order from `topological_sort` (pass
+    `sort_result` if it has already been computed). Runs in time linear in
+    the size of the plan, plus a log factor for the worker plan.
+    """
+    if workers < 1:
+        raise ValueError("At least one worker is needed to schedule a project.")
+    from .sort_utilities import sorted_project
+
+    sort_result = sorted_project(
+        project=project, complete_is_tree=complete_is_tree, sort_result=sort_result
+    )
+    G, by_title, stages = sort_result
+    with phase("schedule"):
+        durations = array(
+            "d", (stage_duration(by_title.get(title)) for title in G.titles)
+        )
+        schedule = Schedule(G=G, durations=durations, workers=workers)
+
+        positions = array("l", [len(stages)]) * len(G)
+        for position, stage in enumerate(stages):
+            positions[stage.node_id] = position
+        order = [stage.node_id for stage in stages]
+
+        compute_critical_path(schedule=schedule, order=order)
+        compute_worker_plan(schedule=schedule, order=order, positions=positions)
+    return schedule
+
+
+def print_schedule(*, schedule):
+    """Prints the stages that need work in the order they start."""
+    from rich.console import Console
+
+    console = Console()
+    G = schedule.G
+    console.print(
+        f"# Schedule for {schedule.workers} worker{'s' if schedule.workers != 1 else ''}",
+        style="bright_magenta",
+    )
+    console.print("")
+    plan = sorted(
+        (node_id for node_id in range(len(G)) if schedule.durations[node_id] > 0),
+        key=lambda node_id: (schedule.start[node_id], schedule.worker[node_id]),
+    )
+    critical = set(schedule.critical_path)
+    counter = 0
+    for node_id in plan:
+        title = G.titles[node_id]
+        counter += 1
+        notes = " (critical)" if title in critical else ""
+        console.print(
+            f"[bright_cyan]{counter}.[/bright_cyan] "
+            f"{schedule.start[node_id]:g}-{schedule.finish[node_id]:g} "
+            f"worker {schedule.worker[node_id] + 1}: "
+            f"{title} (slack {schedule.slack(node_id):g}){notes}",
+            style="bright_green" if notes else "cyan",
+            highlight=False,
+        )
+    console.print(
+        f"\nFinished by: {schedule.makespan:g} "
+        f"(critical path alone: {schedule.critical_finish:g})",
+        style="bright_yellow",
+    )
+    console.print(
+        "Critical path: "
+        + " -> ".join(
+            title
+            for title in schedule.critical_path
+            if schedule.durations[G.ids[title]] > 0
+        ),
+        style="bright_yellow",
+        highlight=False,
+    )
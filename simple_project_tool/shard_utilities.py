@@ -0,0 +1,225 @@
+import os
+import re
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from .general_utilities import INDENT_SPACES, write_atomically
+from .mermaid_utilities import (
+    iter_mermaid_styles,
+    layout_mermaid,
+    mermaid_leaf_declaration,
+    node_ref,
+)
+from .profile_utilities import phase
+
+INDEX_FILE_NAME = "index.mmd"
+STUB_STYLE = "fill:#EEEEEE,stroke:#999,stroke-dasharray:5 5"
+
+
+def shard_file_name(*, position, count, title):
+    """Returns `<position>-<title slug>.mmd`, numbered so the files list in order."""
+    slug = re.sub(r"\W+", "-", title.lower()).strip("-")[:60].strip("-")
+    return f"{position:0{len(str(count))}d}-{slug or 'stage'}.mmd"
+
+
+def iter_sub_graph_stages(sub_graph):
+    """Yields the stage of a sub graph and of everything nested in it."""
+    pending = [sub_graph]
+    while pending:
+        sub_graph = pending.pop()
+        yield sub_graph.stage
+        yield from sub_graph.sub_stages
+        pending.extend(reversed(sub_graph.sub_graphs))
+
+
+def iter_shard_lines(*, sub_graph, stubs, edges):
+    """Yields the lines of one shard's diagram.
+
+    `stubs` lists `(node_ref, title)` for the stages drawn in other files
+    that this shard has edges to or from, and `edges` every edge to, from
+    or within the shard as `(from_ref, to_ref)`.
+    """
+    yield "flowchart BT"
+    yield from sub_graph.iter_mermaid_lines()
+    yield ""
+    for stub_ref, title in stubs:
+        yield f'{stub_ref}[["{title}"]]'
+    if stubs:
+        yield ""
+    for from_ref, to_ref in edges:
+        yield f"{from_ref} --> {to_ref}"
+    yield ""
+    for stub_ref, _ in stubs:
+        yield f"style {stub_ref} {STUB_STYLE}"
+    yield from iter_mermaid_styles(stages=iter_sub_graph_stages(sub_graph))
+
+
+def boundary_declaration(stage):
+    """Returns the line declaring a stage linked to another shard in the index."""
+    if stage.leaf:
+        return mermaid_leaf_declaration(stage=stage, indentation_level=1)
+    indent = " " * INDENT_SPACES
+    if stage.milestone:
+        return f'{indent}{stage.sub_graph.head_id}{{{{"{stage.title}"}}}}'
+    return f'{indent}{stage.sub_graph.head_id}["{stage.title}"]'
+
+
+def write_shard(path, sub_graph, stubs, edges):
+    """Writes one shard's diagram to `path` and returns the path.
+
+    Module level so it can run in a worker process. The sub graph only
+    holds its own stages, which refer to others by node id, so just the
+    shard is sent to the worker.
+    """
+    lines = iter_shard_lines(sub_graph=sub_graph, stubs=stubs, edges=edges)
+    write_atomically(path=path, data="".join(f"{line}\n" for line in lines).encode())
+    return path
+
+
+def top_level_owners(*, G, stages, project_id):
+    """Returns each node's top-level stage (itself for the project) by node id."""
+    owner = array("l", [-1]) * len(G.titles)
+    owner[project_id] = project_id
+    # A stage's parent always comes after it in the sort order.
+    for stage in reversed(stages):
+        if stage.parent == project_id:
+            owner[stage.node_id] = stage.node_id
+        elif stage.parent != -1:
+            owner[stage.node_id] = owner[stage.parent]
+    return owner
+
+
+def write_sharded_mermaid(
+    *,
+    project,
+    complete_is_tree,
+    out_dir,
+    jobs=None,
+    sort_result=None,
+    reduce_edges=False,
+    stable_ids=False,
+):
+    """Writes the Mermaid diagram split into one file per top-level sub graph.
+
+    Each top-level stage with sub-stages gets its own diagram, with the
+    stages in other files it has edges to or from drawn as stub nodes.
+    `index.mmd` draws the project, its top-level leaves and each shard as a
+    sub graph holding only the stages linked to other shards, with those
+    links. Every edge drawn is an edge of the full diagram, and the node ids
+    are those of the full diagram, so a stage can be found in either.
+    Shards are written by `jobs` processes (one per CPU by default).
+    Returns the paths written, index last.
+    """
+    from .sort_utilities import sorted_project
+
+    sort_result = sorted_project(
+        project=project, complete_is_tree=complete_is_tree, sort_result=sort_result
+    )
+    G, by_title, stages = sort_result
+    out_dir = Path(out_dir)
+
+    with phase("mermaid"):
+        layout = layout_mermaid(
+            project=project, sort_result=sort_result, stable_ids=stable_ids
+        )
+        project_id = layout.project_id
+        owner = top_level_owners(G=G, stages=stages, project_id=project_id)
+
+        # For each shard, its sub graph, stubs, edges and the stages linked
+        # to other shards, which are all the index shows of it.
+        shards = {
+            sub_graph.stage.node_id: (sub_graph, {}, [], {})
+            for sub_graph in layout.top_level_sub_graphs
+        }
+        index_edges = []
+        successors = G.transitive_reduction() if reduce_edges else G.successors
+        for stage in layout.edge_sources():
+            from_owner = owner[stage.node_id]
+            from_ref = node_ref(stage)
+            for to_id in successors[stage.node_id]:
+                to_owner = owner[to_id]
+                if to_id == project_id:
+                    to_stage, to_ref = None, "Project"
+                else:
+                    to_stage = by_title[G.titles[to_id]]
+                    to_ref = node_ref(to_stage)
+                if from_owner == to_owner:
+                    shards[from_owner][2].append((from_ref, to_ref))
+                    continue
+                # Drawn in both shards, the other end as a stub, and in the
+                # index.
+                if from_owner in shards:
+                    _, stubs, edges, boundary = shards[from_owner]
+                    stubs[to_ref] = G.titles[to_id]
+                    edges.append((from_ref, to_ref))
+                    boundary[stage.node_id] = stage
+                if to_owner in shards:
+                    _, stubs, edges, boundary = shards[to_owner]
+                    stubs[from_ref] = stage.title
+                    edges.append((from_ref, to_ref))
+                    boundary[to_id] = to_stage
+                index_edges.append((from_ref, to_ref))
+
+        arguments = []
+        for position, (sub_graph, stubs, edges, _) in enumerate(shards.values(), 1):
+            file_name = shard_file_name(
+                position=position, count=len(shards), title=sub_graph.stage.title
+            )
+            arguments.append(
+                (out_dir / file_name, sub_graph, list(stubs.items()), edges)
+            )
+
+        if jobs is None:
+            jobs = os.cpu_count() or 1
+        jobs = min(jobs, len(arguments))
+        if jobs <= 1:
+            paths = [write_shard(*argument) for argument in arguments]
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                paths = list(
+                    pool.map(
+                        write_shard,
+                        *zip(*arguments),
+                        chunksize=max(1, len(arguments) // (jobs * 4)),
+                    )
+                )
+
+        index_lines = [
+            "flowchart BT",
+            f'Project(["{project["title"]}"])',
+            "",
+            "style Project fill:#AC36BC,stroke:#333,stroke-width:2px,color:#fff",
+            "",
+        ]
+        index_stages = list(layout.top_level_leaves)
+        for leaf in layout.top_level_leaves:
+            index_lines.append(mermaid_leaf_declaration(stage=leaf))
+        for path, (sub_graph, _, _, boundary) in zip(paths, shards.values()):
+            head = sub_graph.stage
+            index_lines.append(f'subgraph "{head.title}"')
+            # The shard's own stage links to its file.
+            index_lines.append(
+                f'{" " * INDENT_SPACES}{sub_graph.head_id}[["{head.title}"]]'
+            )
+            index_lines.append(
+                f'{" " * INDENT_SPACES}click {sub_graph.head_id} "{path.name}"'
+            )
+            index_stages.append(head)
+            for stage in boundary.values():
+                if stage is not head:
+                    index_lines.append(boundary_declaration(stage))
+                    index_stages.append(stage)
+            index_lines.append("end")
+            index_lines.append("")
+        index_lines.extend(
+            f"{from_ref} --> {to_ref}" for from_ref, to_ref in index_edges
+        )
+        index_lines.append("")
+        index_lines.extend(iter_mermaid_styles(stages=index_stages))
+        index_path = out_dir / INDEX_FILE_NAME
+        write_atomically(
+            path=index_path,
+            data="".join(f"{line}\n" for line in index_lines).encode(),
+        )
+    return paths + [index_path]
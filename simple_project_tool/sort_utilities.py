@@ -1,92 +1,112 @@
-import sys
-import networkx as nx
+from .dag_utilities import StageGraph
 from .general_utilities import is_leaf
-
-
-def sort_stage(*, G, by_title, parent_stage, stage, parallel):
-    by_title[stage["title"]] = stage
-    stage["parent"] = parent_stage
-    G.add_node(stage["title"])
+from .profile_utilities import phase
+from .stage_utilities import Stage
+from .validation_utilities import validate_graph
+
+
+def sort_stage(*, G, by_title, parent_stage, stage, parallel, keep_source=False):
+    """Adds a stage and everything in it to `G` and `by_title`, returning its `Stage`.
+
+    `parent_stage` is the parent's `Stage` and `stage` the mapping parsed
+    from the file, which is left untouched. With `keep_source` set each
+    `Stage` keeps a reference to its mapping, for writing the document back.
+    """
+    title = stage["title"]
+    node = Stage(
+        node_id=G.add_node(title),
+        stage=stage,
+        parent=-1 if parent_stage is None else parent_stage.node_id,
+        parallel=parallel,
+        keep_source=keep_source,
+    )
+    by_title[title] = node
+    children = []
 
     if "depends_on" in stage:
         for dependency in stage["depends_on"]:
-            G.add_edge(dependency, stage["title"])
+            G.add_edge(dependency, title)
 
     if "stages" in stage:
         previous_sub_stage = None
         for sub_stage in stage["stages"]:
-            sort_stage(
+            sub_node = sort_stage(
                 G=G,
                 by_title=by_title,
-                parent_stage=stage,
+                parent_stage=node,
                 stage=sub_stage,
                 parallel=False,
+                keep_source=keep_source,
             )
+            children.append(sub_node.node_id)
             if previous_sub_stage is not None:
                 G.add_edge(previous_sub_stage["title"], sub_stage["title"])
             previous_sub_stage = sub_stage
         if previous_sub_stage is not None:
-            G.add_edge(previous_sub_stage["title"], stage["title"])
+            G.add_edge(previous_sub_stage["title"], title)
 
     if "parallel_stages" in stage:
         for sub_stage in stage["parallel_stages"]:
-            sort_stage(
+            sub_node = sort_stage(
                 G=G,
                 by_title=by_title,
-                parent_stage=stage,
+                parent_stage=node,
                 stage=sub_stage,
                 parallel=True,
+                keep_source=keep_source,
             )
+            children.append(sub_node.node_id)
+    if children:
+        node.children = tuple(children)
     if parallel:
         if parent_stage is None:
             raise ValueError("Parallel stages must have a parent stage to connect to.")
-        G.add_edge(stage["title"], parent_stage["title"])
-        stage["parallel"] = True
+        G.add_edge(title, parent_stage.title)
+    return node
 
 
 # We always walk the tree to sort out priorities. We also take care of
 # complete_is_tree here.
-def walk_the_tree(*, G, by_title, stage, complete_is_tree, updating_yaml):
-    """Walks the tree to set the `complete` flag for each stage based on its dependencies. Also takes care of priorities by marking any task further down the tree with the highest priority it's seen so far."""
-    stage_complete = stage.get("complete", False)
-
-    for from_node, to_node in G.in_edges(stage["title"]):
-        if not from_node in by_title:
-            raise ValueError(
-                f"Node '{from_node}' not found. This indicates a dependency on a stage that is not defined."
-            )
-        from_node_stage = by_title[from_node]
-        if complete_is_tree and stage_complete:
-            from_node_stage["complete"] = True
-
-        # Patch the priority as the highest seen so far in order to correctly
-        # prioritize the stages.
-        if not updating_yaml:
-            stage_priority = stage.get("priority", None)
-            from_node_stage_priority = from_node_stage.get("priority", None)
-            if (stage_priority is not None) and (
-                (
-                    (from_node_stage_priority is None)
-                    or from_node_stage_priority < stage_priority
-                )
-            ):
-                from_node_stage["priority"] = stage_priority
-        walk_the_tree(
-            G=G,
-            by_title=by_title,
-            stage=from_node_stage,
-            complete_is_tree=complete_is_tree,
-            updating_yaml=updating_yaml,
-        )
+def walk_the_tree(*, G, by_title, complete_is_tree, updating_yaml):
+    """Propagates the `complete` flag and priorities from each stage to the stages it depends on.
+
+    Stages are visited once each in reverse topological order (project first),
+    so every stage has received everything it inherits from the stages that
+    depend on it before it passes it on. A stage ends up complete if it, or any
+    stage depending on it, is complete (when `complete_is_tree` is set), and
+    with the highest priority seen among itself and the stages depending on it.
+    The graph must have passed `validate_graph`, so every node is a stage.
+    """
+    for node_id in reversed(G.topological_order()):
+        stage = by_title[G.titles[node_id]]
+        stage_complete = stage.complete
+        stage_priority = stage.priority
+
+        for from_id in G.predecessors[node_id]:
+            from_node_stage = by_title[G.titles[from_id]]
+            if complete_is_tree and stage_complete:
+                from_node_stage.complete = True
+
+            # Patch the priority as the highest seen so far in order to correctly
+            # prioritize the stages.
+            if not updating_yaml:
+                from_node_stage_priority = from_node_stage.priority
+                if (stage_priority is not None) and (
+                    (
+                        (from_node_stage_priority is None)
+                        or from_node_stage_priority < stage_priority
+                    )
+                ):
+                    from_node_stage.priority = stage_priority
 
 
 def node_priority_for_sorting(*, node, by_title):
     """Returns the priority for sorting nodes in topological sort."""
     # If a custom priority is set, use it.
     stage = by_title[node]
-    if "priority" in stage:
+    if stage.priority is not None:
         # Reverse the priority for sorting purposes, so that higher priority stages come first.
-        return -stage["priority"]
+        return -stage.priority
 
     # If the node is a leaf, it has the lowest priority (1).
     # Otherwise, it has a higher priority (0).
@@ -94,40 +114,56 @@ def node_priority_for_sorting(*, node, by_title):
 
 
 def topological_sort(*, project, complete_is_tree, updating_yaml):
-    G = nx.DiGraph()
+    G = StageGraph()
     by_title = {}
-    sort_stage(
-        G=G,
-        by_title=by_title,
-        parent_stage=None,
-        stage=project,
-        parallel=False,
-    )
+    with phase("sort_stage"):
+        sort_stage(
+            G=G,
+            by_title=by_title,
+            parent_stage=None,
+            stage=project,
+            parallel=False,
+            keep_source=updating_yaml,
+        )
+    # Check for undefined dependencies, duplicate titles and cycles up front,
+    # reporting them all at once.
+    with phase("validate_graph"):
+        validate_graph(G=G, by_title=by_title, project=project)
 
     # We always walk the tree to sort out priorities. We also take care of
     # complete_is_tree here.
-    walk_the_tree(
-        G=G,
-        by_title=by_title,
-        stage=project,
-        complete_is_tree=complete_is_tree,
-        updating_yaml=updating_yaml,
-    )
-    # TODO: Test and handle failure caused by depending on a stage that is not defined
-    # TODO: Test and handle cycles in the graph
-    # TODO: Check that nothing depends on the project stage itself
-
-    stages = list(
-        [
-            by_title[title]
-            for title in nx.lexicographical_topological_sort(
-                G, key=lambda n: node_priority_for_sorting(node=n, by_title=by_title)
-            )
-        ]
-    )
+    with phase("walk_the_tree"):
+        walk_the_tree(
+            G=G,
+            by_title=by_title,
+            complete_is_tree=complete_is_tree,
+            updating_yaml=updating_yaml,
+        )
+    with phase("topological_sort"):
+        stages = list(
+            [
+                by_title[title]
+                for title in G.lexicographical_topological_sort(
+                    key=lambda n: node_priority_for_sorting(node=n, by_title=by_title)
+                )
+            ]
+        )
 
     return (
         G,
         by_title,
         stages,
     )
+
+
+def sorted_project(*, project, complete_is_tree, sort_result=None):
+    """Returns `sort_result`, sorting the project first if it is None.
+
+    The outputs take an already computed `topological_sort` result, such as
+    one loaded from the cache, and only sort the project without one.
+    """
+    if sort_result is None:
+        sort_result = topological_sort(
+            project=project, complete_is_tree=complete_is_tree, updating_yaml=False
+        )
+    return sort_result
@@ -0,0 +1,58 @@
+from .general_utilities import is_leaf
+
+
+class Stage:
+    """One stage of a project, as sorted, drawn and listed.
+
+    Stages are built once from the parsed document by `sort_stage` and the
+    document itself is never changed. `node_id` is the stage's id in the
+    stage graph, and `parent` (-1 for the project) and `children` are node
+    ids too, so stages refer to each other by integer rather than by
+    reference. `priority` and `complete` start as written in the file and
+    become the inherited values once `walk_the_tree` has run. `leaf_ref` and
+    `sub_graph` hold the Mermaid node id or sub graph the stage is drawn as.
+    `source` is the stage's mapping in the document, only kept when the
+    document is going to be written back out.
+    """
+
+    __slots__ = (
+        "node_id",
+        "title",
+        "parent",
+        "children",
+        "parallel",
+        "leaf",
+        "milestone",
+        "complete",
+        "priority",
+        "estimate",
+        "source",
+        "leaf_ref",
+        "sub_graph",
+    )
+
+    def __init__(self, *, node_id, stage, parent, parallel, keep_source=False):
+        self.node_id = node_id
+        self.title = stage["title"]
+        self.parent = parent
+        self.children = ()
+        self.parallel = parallel
+        self.leaf = is_leaf(stage)
+        self.milestone = bool(stage.get("milestone", False))
+        self.complete = bool(stage.get("complete", False))
+        self.priority = stage.get("priority", None)
+        self.estimate = stage.get("estimate", None)
+        self.source = stage if keep_source else None
+        self.leaf_ref = None
+        self.sub_graph = None
+
+    # Pickled as a plain tuple of values, which keeps cache entries small.
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+    def __repr__(self):
+        return f"Stage(node_id={self.node_id}, title={self.title!r})"
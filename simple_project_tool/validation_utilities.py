@@ -0,0 +1,139 @@
+import sys
+from array import array
+from collections import Counter
+from pathlib import Path
+
+
+class ProjectValidationError(ValueError):
+    """Raised when a project's stages do not form a valid plan.
+
+    `problems` lists every problem found as `(title, message)`, where
+    `title` is the stage the problem should be reported against.
+    """
+
+    def __init__(self, problems):
+        self.problems = problems
+        super().__init__("\n".join(message for _, message in problems))
+
+
+def iter_stage_titles(project):
+    """Yields every stage's title, including repeats, without recursion."""
+    pending = [project]
+    while pending:
+        stage = pending.pop()
+        yield stage["title"]
+        pending.extend(stage.get("stages", ()))
+        pending.extend(stage.get("parallel_stages", ()))
+
+
+def find_problems(*, G, by_title, project):
+    """Returns every problem with the graph built by `sort_stage`, in linear time.
+
+    Finds titles used by more than one stage, dependencies on titles no
+    stage has, stages depending on the project itself and every cycle.
+    """
+    problems = []
+    for title, count in Counter(iter_stage_titles(project)).items():
+        if count > 1:
+            problems.append((title, f"'{title}' is the title of {count} stages."))
+
+    project_id = G.ids[project["title"]]
+    for node_id, title in enumerate(G.titles):
+        if title not in by_title:
+            for to_id in G.successors[node_id]:
+                dependent = G.titles[to_id]
+                problems.append(
+                    (
+                        dependent,
+                        f"'{dependent}' depends on '{title}', which is not defined.",
+                    )
+                )
+    for to_id in G.successors[project_id]:
+        dependent = G.titles[to_id]
+        problems.append(
+            (
+                dependent,
+                f"'{dependent}' depends on the project '{project['title']}', "
+                "which depends on every stage.",
+            )
+        )
+
+    # Dependencies on the project always make a cycle through it, and have
+    # been reported already, so look for cycles without them.
+    successors = list(G.successors)
+    successors[project_id] = array("l")
+    for component in G.strongly_connected_components(successors=successors):
+        node_id = component[0]
+        if len(component) == 1 and node_id not in successors[node_id]:
+            continue
+        cycle = [G.titles[i] for i in G.find_cycle(component, successors=successors)]
+        problems.append(
+            (
+                cycle[0],
+                "Cycle: " + " -> ".join(f"'{title}'" for title in cycle),
+            )
+        )
+    return problems
+
+
+def validate_graph(*, G, by_title, project):
+    """Raises `ProjectValidationError` listing every problem, if there are any."""
+    problems = find_problems(G=G, by_title=by_title, project=project)
+    if problems:
+        raise ProjectValidationError(problems)
+
+
+def stage_locations(yaml_file):
+    """Returns `{title: [(path, line), ...]}` for every stage in a project's files.
+
+    Follows `include` like `compose_project`. Only the YAML nodes are
+    built, with the fast parser, as this is just for pointing at problems.
+    """
+    from ruamel.yaml import YAML
+
+    yaml = YAML(typ="safe")
+    locations = {}
+    pending_files = [Path(yaml_file)]
+    seen = set()
+    while pending_files:
+        path = pending_files.pop()
+        if path.resolve() in seen:
+            continue
+        seen.add(path.resolve())
+        with open(path) as f:
+            root = yaml.compose(f)
+        pending = [(root, True)]
+        while pending:
+            node, is_root = pending.pop()
+            values = {key.value: value for key, value in node.value}
+            title = values.get("title")
+            if title is not None:
+                locations.setdefault(title.value, []).append(
+                    (path, node.start_mark.line + 1)
+                )
+            for key in ("parallel_stages", "stages"):
+                if key in values:
+                    pending.extend((stage, False) for stage in values[key].value)
+            if is_root and "include" in values:
+                pending_files.extend(
+                    path.parent / include.value for include in values["include"].value
+                )
+    return locations
+
+
+def print_validation_error(error, *, yaml_file):
+    """Prints each problem on stderr, prefixed by where the stage is defined."""
+    try:
+        locations = stage_locations(yaml_file)
+    except Exception:
+        locations = {}
+    print(
+        f"The project has {len(error.problems)} "
+        f"problem{'s' if len(error.problems) != 1 else ''}:",
+        file=sys.stderr,
+    )
+    for title, message in error.problems:
+        where = ", ".join(
+            f"{path}:{line}" for path, line in sorted(locations.get(title, []))
+        )
+        print(f"{where}: {message}" if where else message, file=sys.stderr)
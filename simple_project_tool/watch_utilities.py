@@ -0,0 +1,257 @@
+import sys
+import time
+from pathlib import Path
+
+from ruamel.yaml import YAMLError
+
+from .general_utilities import is_leaf, write_atomically
+from .mermaid_utilities import iter_mermaid_structure, iter_mermaid_styles, node_ref
+from .order_of_work import iter_order_of_work_lines
+from .sort_utilities import node_priority_for_sorting, topological_sort, walk_the_tree
+from .include_utilities import compose_project
+
+
+def index_project(project):
+    """Summarises the project without building the graph.
+
+    Stages are visited in the same order as `sort_stage`, so duplicate titles
+    resolve the same way. Returns `(structure, declared)`, where `structure`
+    captures everything that affects the graph or the node declarations, and
+    `declared` maps each title to the `(priority, complete)` written in the
+    file.
+    """
+    structure = []
+    declared = {}
+    pending = [(project, None, False)]
+    while pending:
+        stage, parent_stage, parallel = pending.pop()
+        structure.append(
+            (
+                stage["title"],
+                None if parent_stage is None else parent_stage["title"],
+                parallel,
+                tuple(stage.get("depends_on", ())),
+                is_leaf(stage),
+                stage.get("milestone", False),
+            )
+        )
+        declared[stage["title"]] = (
+            stage.get("priority", None),
+            bool(stage.get("complete", False)),
+        )
+        # Pushed in reverse so `stages` are visited before `parallel_stages`
+        for sub_stage in reversed(stage.get("parallel_stages", [])):
+            pending.append((sub_stage, stage, True))
+        for sub_stage in reversed(stage.get("stages", [])):
+            pending.append((sub_stage, stage, False))
+    return structure, declared
+
+
+class ProjectWatcher:
+    """Keeps a project's outputs up to date as its YAML file changes.
+
+    The graph, stage order, Mermaid node ids and rendered diagram structure
+    from the last run are kept in memory. When an edit leaves the stage tree
+    and dependencies alone, only the priorities and completion flags that
+    changed are worked through: the graph is reused, completion is pushed to
+    just the stages a newly completed stage depends on, and the diagram's
+    declarations and edges are reused with only the style lines redone.
+    """
+
+    def __init__(
+        self, *, yaml_file, complete_is_tree, incomplete_only, stable_ids=False
+    ):
+        self.yaml_file = Path(yaml_file)
+        self.complete_is_tree = complete_is_tree
+        self.incomplete_only = incomplete_only
+        self.stable_ids = stable_ids
+        self.mermaid_path = self.yaml_file.with_suffix(".mmd")
+        self.order_path = self.yaml_file.with_suffix(".order.txt")
+        # Every file making up the project (see include_utilities), and
+        # their signatures when last loaded.
+        self.files = [self.yaml_file]
+        self.file_signature = None
+        self.structure = None
+        self.declared = None
+        self.effective = None
+        self.G = None
+        self.by_title = None
+        self.order = None
+        self.node_refs = None
+        self.mermaid_structure = None
+
+    def file_changed(self):
+        try:
+            signature = [
+                (stat.st_mtime_ns, stat.st_size)
+                for stat in (path.stat() for path in self.files)
+            ]
+        except FileNotFoundError:
+            # Editors often replace files on save; wait for the new one.
+            return False
+        if signature == self.file_signature:
+            return False
+        self.file_signature = signature
+        return True
+
+    def update(self):
+        start = time.perf_counter()
+        try:
+            project, files = compose_project(self.yaml_file)
+        except SystemExit:
+            # parse_yaml has already reported the problem.
+            print("Waiting for the file to be fixed...", file=sys.stderr)
+            return
+        except (YAMLError, OSError) as e:
+            # Editors can leave a file half written, or replace it, while
+            # saving; the next save will be picked up as usual.
+            print(f"Could not read the project: {e}", file=sys.stderr)
+            print("Waiting for the file to be fixed...", file=sys.stderr)
+            return
+        if files != self.files:
+            # Start watching newly included files too.
+            self.files = files
+            self.file_changed()
+        structure, declared = index_project(project)
+        try:
+            if structure != self.structure:
+                how = "full rebuild"
+                stages = self._rebuild(project=project)
+            else:
+                changed = [
+                    title
+                    for title, values in declared.items()
+                    if self.declared[title] != values
+                ]
+                if not changed:
+                    self.declared = declared
+                    return
+                how = f"{len(changed)} stage(s) changed"
+                stages = self._apply_changes(
+                    project=project, changed=changed, declared=declared
+                )
+        except ValueError as e:
+            print(f"Could not sort the project: {e}", file=sys.stderr)
+            self.structure = None
+            return
+        self.structure = structure
+        self.declared = declared
+        self._write(stages=stages)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(
+            f"Updated {self.mermaid_path.name} and {self.order_path.name} "
+            f"in {elapsed:.1f} ms ({how})",
+            file=sys.stderr,
+        )
+
+    def _rebuild(self, *, project):
+        sort_result = topological_sort(
+            project=project,
+            complete_is_tree=self.complete_is_tree,
+            updating_yaml=False,
+        )
+        self.G, self.by_title, stages = sort_result
+        self._render_structure(project=project, sort_result=sort_result)
+        self._remember_effective()
+        return stages
+
+    def _apply_changes(self, *, project, changed, declared):
+        by_title = self.by_title
+        priorities_changed = any(
+            self.declared[title][0] != declared[title][0] for title in changed
+        )
+        completion_lost = any(
+            self.declared[title][1] and not declared[title][1] for title in changed
+        )
+        if priorities_changed or (completion_lost and self.complete_is_tree):
+            # Inherited values can shrink, so start again from the values in
+            # the file and propagate over the existing graph rather than
+            # patching the previous results.
+            for title, stage in by_title.items():
+                stage.priority, stage.complete = declared[title]
+            walk_the_tree(
+                G=self.G,
+                by_title=by_title,
+                complete_is_tree=self.complete_is_tree,
+                updating_yaml=False,
+            )
+            self._remember_effective()
+        else:
+            for title in changed:
+                self._mark_complete(title, declared[title][1])
+            for title, stage in by_title.items():
+                stage.priority, stage.complete = self.effective[title]
+
+        if priorities_changed:
+            order = self.G.lexicographical_topological_sort(
+                key=lambda n: node_priority_for_sorting(node=n, by_title=by_title)
+            )
+            if order != self.order:
+                stages = [by_title[title] for title in order]
+                self._render_structure(
+                    project=project, sort_result=(self.G, by_title, stages)
+                )
+                return stages
+        return [by_title[title] for title in self.order]
+
+    def _mark_complete(self, title, complete):
+        priority, _ = self.effective[title]
+        self.effective[title] = (priority, complete)
+        if not (complete and self.complete_is_tree):
+            return
+        # Everything the stage depends on is complete too. Stop at stages
+        # that already are, as everything they depend on already is.
+        G = self.G
+        pending = list(G.predecessors[G.ids[title]])
+        while pending:
+            from_title = G.titles[pending.pop()]
+            priority, from_complete = self.effective[from_title]
+            if from_complete:
+                continue
+            self.effective[from_title] = (priority, True)
+            pending.extend(G.predecessors[G.ids[from_title]])
+
+    def _remember_effective(self):
+        self.effective = {
+            title: (stage.priority, stage.complete)
+            for title, stage in self.by_title.items()
+        }
+
+    def _render_structure(self, *, project, sort_result):
+        stages = sort_result[2]
+        self.mermaid_structure = list(
+            iter_mermaid_structure(
+                project=project,
+                sort_result=sort_result,
+                stable_ids=self.stable_ids,
+            )
+        )
+        self.node_refs = {stage.title: node_ref(stage) for stage in stages}
+        self.order = [stage.title for stage in stages]
+
+    def _write(self, *, stages):
+        node_refs = self.node_refs
+        mermaid_lines = self.mermaid_structure + list(
+            iter_mermaid_styles(
+                stages=stages, node_ref_of=lambda stage: node_refs[stage.title]
+            )
+        )
+        order_lines = iter_order_of_work_lines(
+            stages=stages, incomplete_only=self.incomplete_only
+        )
+        write_atomically(
+            path=self.mermaid_path, data=("\n".join(mermaid_lines) + "\n").encode()
+        )
+        write_atomically(
+            path=self.order_path, data=("\n".join(order_lines) + "\n").encode()
+        )
+
+    def run(self, *, interval):
+        print(f"Watching {self.yaml_file} (Ctrl+C to stop)", file=sys.stderr)
+        try:
+            while True:
+                if self.file_changed():
+                    self.update()
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
@@ -2,83 +2,198 @@ from io import StringIO
 import json
 import shutil
 import sys
-from ruamel.yaml import YAML
-from jsonschema import validate, ValidationError
+from ruamel.yaml import YAML, YAMLError
+from jsonschema.exceptions import best_match
+from jsonschema.validators import validator_for
 from pathlib import Path
 
-from .sort_utilities import topological_sort
+from .general_utilities import flush_if_possible
+from .profile_utilities import phase
 
+_validator = None
+
+
+def get_validator():
+    """Returns the project schema validator, building it on first use.
+
+    The schema is read and checked once per process and the compiled
+    validator is reused for every file after that.
+    """
+    global _validator
+    if _validator is None:
+        with open(Path(__file__).parent / "schema.json") as f:
+            schema = json.load(f)
+        validator_class = validator_for(schema)
+        validator_class.check_schema(schema)
+        _validator = validator_class(schema)
+    return _validator
 
-def parse_yaml(yaml_file):
-    yaml = YAML()
-    with open(yaml_file) as f:
-        data = yaml.load(f)
 
-    with open(Path(__file__).parent / "schema.json") as f:
-        schema = json.load(f)
+def error_line(*, data, error):
+    """Returns the 1-based line number nearest to a validation error, or None."""
+    obj = data
+    last_obj_with_lc = data if hasattr(data, "lc") else None
+    for key in error.path:
+        try:
+            obj = obj[key]
+            if hasattr(obj, "lc"):
+                last_obj_with_lc = obj
+        except Exception:
+            obj = None
+            break
+    # Prefer the most specific object with line info
+    if hasattr(obj, "lc"):
+        return obj.lc.line + 1
+    elif last_obj_with_lc is not None:
+        return last_obj_with_lc.lc.line + 1
+    return None
 
-    try:
-        validate(instance=data, schema=schema)
+
+def parse_yaml(yaml_file, *, round_trip=True):
+    """Loads and validates a project file, exiting with a message if it is invalid.
+
+    Round-trip mode keeps comments and line numbers so the document can be
+    written back out. Read-only callers can pass `round_trip=False` to use the
+    much faster libyaml-backed safe loader, which returns plain dicts and
+    lists; if validation fails the file is re-read in round-trip mode so the
+    error can still be given a line number.
+    """
+    yaml = YAML() if round_trip else YAML(typ="safe")
+    with phase("parse"), open(yaml_file) as f:
+        data = yaml.load(f)
+
+    with phase("validate"):
+        error = best_match(get_validator().iter_errors(data))
+    if error is None:
         return data
-    except ValidationError as e:
-        print("YAML validation error:", e, file=sys.stderr)
-        obj = data
-        last_obj_with_lc = None
-        for key in e.path:
-            try:
-                obj = obj[key]
-                if hasattr(obj, "lc"):
-                    last_obj_with_lc = obj
-            except Exception:
-                obj = None
-                break
-        # Prefer the most specific object with line info
-        if hasattr(obj, "lc"):
-            print(f"\nError near line: {obj.lc.line + 1}", file=sys.stderr)
-        elif last_obj_with_lc is not None:
-            print(f"\nError near line: {last_obj_with_lc.lc.line + 1}", file=sys.stderr)
-        else:
-            print("\nError location could not be determined.", file=sys.stderr)
-        sys.exit(1)
+    if not round_trip:
+        return parse_yaml(yaml_file, round_trip=True)
 
+    print("YAML validation error:", error, file=sys.stderr)
+    line = error_line(data=data, error=error)
+    if line is not None:
+        print(f"\nError near line: {line}", file=sys.stderr)
+    else:
+        print("\nError location could not be determined.", file=sys.stderr)
+    sys.exit(1)
 
-def update_yaml(*, project, complete_is_tree):
-    G, by_title, stages = topological_sort(
-        project=project, complete_is_tree=complete_is_tree, updating_yaml=True
-    )
-    # Remove patched keys from stages
-    patched_keys = ["parent", "parallel"]
-    for stage in stages:
-        for key in patched_keys:
-            if key in stage:
-                del stage[key]
 
+def validate_many(paths):
+    """Validates several project files, collecting every error instead of exiting.
+
+    Returns a list of `(path, line, message)` tuples, where `line` is the
+    1-based line number or None when it could not be determined. An empty
+    list means every file is valid.
+    """
     yaml = YAML()
-    yaml.indent(mapping=2, sequence=4, offset=0)
-    stream = StringIO()
-    yaml.dump(project, stream)
-    yaml_string = stream.getvalue()
+    validator = get_validator()
+    problems = []
+    for path in paths:
+        try:
+            with open(path) as f:
+                data = yaml.load(f)
+        except OSError as e:
+            problems.append((path, None, str(e)))
+            continue
+        except YAMLError as e:
+            mark = getattr(e, "problem_mark", None)
+            line = mark.line + 1 if mark is not None else None
+            problems.append((path, line, str(e)))
+            continue
+        for error in validator.iter_errors(data):
+            problems.append((path, error_line(data=data, error=error), error.message))
+    return problems
+
+
+class TrailingSpaceStripper:
+    """A text sink that drops spaces at the ends of lines before passing text on.
+
+    ruamel leaves a space at the end of each line when it folds a long plain
+    scalar, which prettier would remove. Spaces at the end of a chunk are
+    held back until it is known whether a line break follows them.
+    """
+
+    # ruamel writes bytes to streams without an `encoding` attribute.
+    encoding = None
+
+    def __init__(self, out):
+        self.out = out
+        self.pending = ""
+
+    def write(self, text):
+        lines = (self.pending + text).split("\n")
+        last = lines.pop()
+        stripped = last.rstrip(" ")
+        self.pending = last[len(stripped) :]
+        lines.append(stripped)
+        self.out.write("\n".join(line.rstrip(" ") for line in lines))
+
+    def flush(self):
+        flush_if_possible(self.out)
+
+
+def formatting_yaml():
+    """Returns a round-trip YAML instance that lays documents out as prettier does.
+
+    Sequences are indented under their key with the dash two spaces in, and
+    mappings by two spaces. Combined with `TrailingSpaceStripper`, this
+    gives the same output as prettier's YAML formatter for project files,
+    without needing Node.
+    """
+    yaml = YAML()
+    yaml.indent(mapping=2, sequence=4, offset=2)
+    return yaml
+
+
+def run_prettier(yaml_string):
+    """Formats YAML text with prettier, exiting with a message if that fails."""
+    import subprocess
+
     prettier_path = shutil.which("prettier")
-    if prettier_path:
-        # Use prettier to format the YAML
-        import subprocess
-
-        result = subprocess.run(
-            [prettier_path, "--parser", "yaml"],
-            input=yaml_string.encode(),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            check=True,
+    if not prettier_path:
+        print("prettier was not found on the PATH.", file=sys.stderr)
+        sys.exit(1)
+    result = subprocess.run(
+        [prettier_path, "--parser", "yaml"],
+        input=yaml_string.encode(),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    if result.returncode != 0:
+        print(
+            "Error formatting YAML with prettier:\n",
+            result.stderr.decode(),
+            file=sys.stderr,
         )
+        sys.exit(2)
+    return result.stdout.decode()
+
 
-        if result.returncode != 0:
-            print(
-                "Error formatting YAML with prettier:\n",
-                result.stderr.decode(),
-                file=sys.stderr,
-            )
-            sys.exit(2)
+def update_yaml(*, project, complete_is_tree, out=None, prettier=False):
+    """Writes the project back out as YAML to `out` (stdout by default).
 
-        yaml_string = result.stdout.decode()
+    The document is streamed out through the built-in formatter. With
+    `prettier` set it is instead buffered and piped through the external
+    prettier command.
+    """
+    from .sort_utilities import topological_sort
 
-    print(yaml_string)
+    G, by_title, stages = topological_sort(
+        project=project, complete_is_tree=complete_is_tree, updating_yaml=True
+    )
+    # Sorting leaves the document alone, so write back the stages that
+    # became complete.
+    for stage in stages:
+        if stage.complete and not stage.source.get("complete", False):
+            stage.source["complete"] = True
+
+    out = sys.stdout if out is None else out
+    yaml = formatting_yaml()
+    with phase("update_yaml"):
+        if prettier:
+            stream = StringIO()
+            yaml.dump(project, stream)
+            out.write(run_prettier(stream.getvalue()))
+        else:
+            yaml.dump(project, TrailingSpaceStripper(out))
+        flush_if_possible(out)
@@ -0,0 +1,119 @@
+"""Checks that `spt complete` edits project files in place byte for byte."""
+
+import pytest
+
+from simple_project_tool.completion_utilities import complete_stages
+
+
+def complete(tmp_path, text, titles):
+    """Writes `text` as a project file, completes `titles` and returns the file's bytes."""
+    path = tmp_path / "project.yaml"
+    path.write_bytes(text.encode())
+    complete_stages(yaml_file=path, titles=titles)
+    return path.read_bytes().decode()
+
+
+def test_inserts_after_multi_line_title(tmp_path):
+    text = (
+        "title: Project\n"
+        "stages:\n"
+        "  - title: A title that goes on\n"
+        "      over two lines\n"
+        "    description: First\n"
+        "  - title: Second\n"
+    )
+    assert complete(tmp_path, text, ["A title that goes on over two lines"]) == (
+        "title: Project\n"
+        "stages:\n"
+        "  - title: A title that goes on\n"
+        "      over two lines\n"
+        "    complete: true\n"
+        "    description: First\n"
+        "  - title: Second\n"
+    )
+
+
+def test_inserts_after_block_scalar_title(tmp_path):
+    text = (
+        "title: Project\n"
+        "stages:\n"
+        "  - title: >-\n"
+        "      Folded title\n"
+        "    description: First\n"
+        "  - title: Second\n"
+    )
+    assert complete(tmp_path, text, ["Folded title"]) == (
+        "title: Project\n"
+        "stages:\n"
+        "  - title: >-\n"
+        "      Folded title\n"
+        "    complete: true\n"
+        "    description: First\n"
+        "  - title: Second\n"
+    )
+
+
+def test_completes_dependencies_and_keeps_comments(tmp_path):
+    text = (
+        "# Plan\n"
+        "title: Project\n"
+        "stages:\n"
+        "  - title: First\n"
+        "    complete: false # not yet\n"
+        "  - title: Second # the one we finish\n"
+    )
+    assert complete(tmp_path, text, ["Second"]) == (
+        "# Plan\n"
+        "title: Project\n"
+        "stages:\n"
+        "  - title: First\n"
+        "    complete: true # not yet\n"
+        "  - title: Second # the one we finish\n"
+        "    complete: true\n"
+    )
+
+
+def test_keeps_crlf_line_endings(tmp_path):
+    text = "title: Project\r\nstages:\r\n  - title: First\r\n  - title: Second\r\n"
+    assert complete(tmp_path, text, ["First"]) == (
+        "title: Project\r\n"
+        "stages:\r\n"
+        "  - title: First\r\n"
+        "    complete: true\r\n"
+        "  - title: Second\r\n"
+    )
+
+
+def test_file_without_trailing_newline(tmp_path):
+    text = "title: Project\nstages:\n  - title: First\n  - title: Second"
+    assert complete(tmp_path, text, ["Second"]) == (
+        "title: Project\n"
+        "stages:\n"
+        "  - title: First\n"
+        "    complete: true\n"
+        "  - title: Second\n"
+        "    complete: true\n"
+    )
+
+
+def test_already_complete_leaves_file_alone(tmp_path):
+    text = "title: Project\nstages:\n  - title: First\n    complete: true\n"
+    assert complete(tmp_path, text, ["First"]) == text
+
+
+def test_refuses_flow_style_stages(tmp_path):
+    path = tmp_path / "project.yaml"
+    text = "title: Project\nstages:\n  - {title: First}\n"
+    path.write_bytes(text.encode())
+    with pytest.raises(ValueError, match="flow style"):
+        complete_stages(yaml_file=path, titles=["First"])
+    assert path.read_bytes().decode() == text
+
+
+def test_unknown_title(tmp_path):
+    path = tmp_path / "project.yaml"
+    text = "title: Project\nstages:\n  - title: First\n"
+    path.write_bytes(text.encode())
+    with pytest.raises(ValueError, match="There is no stage titled 'Missing'"):
+        complete_stages(yaml_file=path, titles=["Missing"])
+    assert path.read_bytes().decode() == text
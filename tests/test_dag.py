@@ -0,0 +1,54 @@
+"""Checks `StageGraph` against networkx on random DAGs."""
+
+import random
+
+import pytest
+
+from simple_project_tool.dag_utilities import StageGraph
+
+nx = pytest.importorskip("networkx")
+
+
+def random_dags(count):
+    """Yields `(StageGraph, networkx.DiGraph)` pairs built from the same random DAG."""
+    rng = random.Random(20240601)
+    for _ in range(count):
+        node_count = rng.randint(1, 40)
+        density = rng.random() * 0.4
+        # Nodes are added in a shuffled order so ids do not follow the
+        # topological order.
+        titles = [f"n{i}" for i in range(node_count)]
+        added = titles[:]
+        rng.shuffle(added)
+        G = StageGraph()
+        N = nx.DiGraph()
+        for title in added:
+            G.add_node(title)
+            N.add_node(title)
+        for i in range(node_count):
+            for j in range(i + 1, node_count):
+                if rng.random() < density:
+                    G.add_edge(titles[i], titles[j])
+                    N.add_edge(titles[i], titles[j])
+        yield G, N
+
+
+def test_transitive_reduction_matches_networkx():
+    for G, N in random_dags(300):
+        reduced = G.transitive_reduction()
+        edges = {
+            (G.titles[from_id], G.titles[to_id])
+            for from_id, successors in enumerate(reduced)
+            for to_id in successors
+        }
+        assert edges == set(nx.transitive_reduction(N).edges)
+
+
+def test_lexicographical_topological_sort_matches_networkx():
+    rng = random.Random(7)
+    for G, N in random_dags(300):
+        # Few distinct keys, so ties have to be broken the same way.
+        keys = {title: rng.randint(0, 3) for title in G.titles}
+        assert G.lexicographical_topological_sort(key=keys.__getitem__) == list(
+            nx.lexicographical_topological_sort(N, key=keys.__getitem__)
+        )
@@ -0,0 +1,47 @@
+"""Checks the Mermaid diagram against output checked in from the original emitter.
+
+To update a golden file after an intended change to the diagram, run for example
+`spt -c tests/fixtures/mermaid_features.yaml >tests/golden/mermaid_features_complete.mmd`
+and review the diff.
+"""
+
+import io
+from pathlib import Path
+
+import pytest
+
+from simple_project_tool.include_utilities import load_project
+from simple_project_tool.mermaid_utilities import generate_mermaid
+
+ROOT = Path(__file__).resolve().parent.parent
+GOLDEN = Path(__file__).resolve().parent / "golden"
+
+CASES = [
+    (ROOT / "project.yaml", False, "project.mmd"),
+    (ROOT / "project.yaml", True, "project_complete.mmd"),
+    (
+        ROOT / "tests" / "fixtures" / "mermaid_features.yaml",
+        False,
+        "mermaid_features.mmd",
+    ),
+    (
+        ROOT / "tests" / "fixtures" / "mermaid_features.yaml",
+        True,
+        "mermaid_features_complete.mmd",
+    ),
+]
+
+
+@pytest.mark.parametrize(
+    "yaml_file, complete_is_tree, golden_name",
+    CASES,
+    ids=[golden_name for _, _, golden_name in CASES],
+)
+def test_mermaid_matches_golden(yaml_file, complete_is_tree, golden_name):
+    out = io.StringIO()
+    generate_mermaid(
+        project=load_project(yaml_file, round_trip=False),
+        complete_is_tree=complete_is_tree,
+        out=out,
+    )
+    assert out.getvalue() == (GOLDEN / golden_name).read_text()
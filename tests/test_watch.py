@@ -0,0 +1,109 @@
+"""Checks that `--watch` updates match a fresh render after every edit."""
+
+import io
+from pathlib import Path
+
+import pytest
+
+from simple_project_tool.include_utilities import load_project
+from simple_project_tool.mermaid_utilities import generate_mermaid
+from simple_project_tool.order_of_work import iter_order_of_work_lines
+from simple_project_tool.sort_utilities import topological_sort
+from simple_project_tool.watch_utilities import ProjectWatcher
+
+FIXTURE = Path(__file__).resolve().parent / "fixtures" / "mermaid_features.yaml"
+
+# Each edit replaces the first occurrence of `old` with `new` in the text as
+# left by the edits before it.
+EDITS = [
+    # Priorities, which can change the order of work.
+    ("    priority: 5\n", "    priority: 0\n"),
+    ("        priority: 1\n", "        priority: 9\n"),
+    # Completing stages, which with -c completes what they depend on.
+    (
+        "      - title: G1 leaf 2\n",
+        "      - title: G1 leaf 2\n        complete: true\n",
+    ),
+    (
+        "  - title: Outer parallel group\n",
+        "  - title: Outer parallel group\n    complete: true\n",
+    ),
+    # Losing completion, which can shrink what was inherited.
+    ("  - title: Top leaf B\n    complete: true\n", "  - title: Top leaf B\n"),
+    (
+        "      - title: G1 leaf 2\n        complete: true\n",
+        "      - title: G1 leaf 2\n",
+    ),
+    # Priority and completion changes together.
+    ("    priority: 0\n", "    priority: 4\n    complete: true\n"),
+    # A new stage, which changes the structure.
+    (
+        "  - title: Top leaf B\n",
+        "  - title: Top leaf B\n  - title: Added leaf\n    depends_on:\n"
+        "      - PG leaf\n",
+    ),
+    ("  - title: Par group\n    complete: true\n", "  - title: Par group\n"),
+]
+
+
+def fresh_outputs(*, yaml_file, complete_is_tree, incomplete_only):
+    out = io.StringIO()
+    generate_mermaid(
+        project=load_project(yaml_file, round_trip=False),
+        complete_is_tree=complete_is_tree,
+        out=out,
+    )
+    sort_result = topological_sort(
+        project=load_project(yaml_file, round_trip=False),
+        complete_is_tree=complete_is_tree,
+        updating_yaml=False,
+    )
+    order_lines = iter_order_of_work_lines(
+        stages=sort_result[2], incomplete_only=incomplete_only
+    )
+    return out.getvalue(), "".join(f"{line}\n" for line in order_lines)
+
+
+@pytest.mark.parametrize("complete_is_tree", [False, True])
+@pytest.mark.parametrize("incomplete_only", [False, True])
+def test_updates_match_fresh_render(tmp_path, complete_is_tree, incomplete_only):
+    yaml_file = tmp_path / "project.yaml"
+    text = FIXTURE.read_text()
+    yaml_file.write_text(text)
+    watcher = ProjectWatcher(
+        yaml_file=yaml_file,
+        complete_is_tree=complete_is_tree,
+        incomplete_only=incomplete_only,
+    )
+    for old, new in [(None, None)] + EDITS:
+        if old is not None:
+            assert old in text
+            text = text.replace(old, new, 1)
+            yaml_file.write_text(text)
+        watcher.update()
+        mermaid, order = fresh_outputs(
+            yaml_file=yaml_file,
+            complete_is_tree=complete_is_tree,
+            incomplete_only=incomplete_only,
+        )
+        assert yaml_file.with_suffix(".mmd").read_text() == mermaid
+        assert yaml_file.with_suffix(".order.txt").read_text() == order
+
+
+def test_survives_syntax_errors(tmp_path, capsys):
+    yaml_file = tmp_path / "project.yaml"
+    text = FIXTURE.read_text()
+    yaml_file.write_text(text)
+    watcher = ProjectWatcher(
+        yaml_file=yaml_file, complete_is_tree=False, incomplete_only=False
+    )
+    watcher.update()
+    yaml_file.write_text(text + "bad: [\n")
+    watcher.update()
+    assert "Waiting for the file to be fixed" in capsys.readouterr().err
+    yaml_file.write_text(text.replace("    priority: 5\n", "    priority: 0\n", 1))
+    watcher.update()
+    mermaid, _ = fresh_outputs(
+        yaml_file=yaml_file, complete_is_tree=False, incomplete_only=False
+    )
+    assert yaml_file.with_suffix(".mmd").read_text() == mermaid